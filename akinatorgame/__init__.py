@@ -4,3 +4,4 @@ from .akinatorcog import AkinatorCog
 def setup(bot):
     cog = AkinatorCog(bot)
     bot.add_cog(cog)
+    bot.loop.create_task(cog.initialize())
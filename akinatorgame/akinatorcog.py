@@ -1,18 +1,34 @@
 import asyncio
+import time
+from io import BytesIO
 from json import JSONDecodeError
+from typing import Optional, Tuple
 
+import aiohttp
 import discord
 from akinator import AkiNoQuestions, CantGoBackAnyFurther, InvalidLanguageError
 from akinator.async_aki import Akinator
-from redbot.core import commands
+from redbot.core import Config, commands
 from redbot.core.bot import Red
-from redbot.core.utils.chat_formatting import humanize_list
+from redbot.core.utils.chat_formatting import box, humanize_list
 from redbot.core.utils.embed import randomize_colour
 from redbot.core.utils.predicates import MessagePredicate
 
+from .api import AkinatorAPI
+from .router import ANSWERS, YES_OR_NO, AnswerRouter
+from .sessions import AlreadyPlaying, SessionLimitReached, SessionManager
+
 __author__ = ["Predeactor"]
 __version__ = "Beta v0.6.4"
 
+MAX_PICTURE_SIZE = 8 * 1024 * 1024
+
+DEFAULT_GLOBAL = {
+    "global_limit": 20,  # Games running at once on the bot.
+    "guild_limit": 5,  # Games running at once in a guild.
+    "idle_timeout": 300,  # Seconds without answer before a game is stopped.
+}
+
 
 def testing_check():
     async def predicate(ctx: commands.Context):
@@ -34,7 +50,32 @@ class AkinatorCog(commands.Cog, name="Akinator"):
     def __init__(self, bot: Red, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.bot = bot
-        self.ongoing_games = {}
+        self.data = Config.get_conf(self, identifier=495954057, force_registration=True)
+        self.data.register_global(**DEFAULT_GLOBAL)
+        self.sessions = SessionManager(**DEFAULT_GLOBAL)
+        self.router = AnswerRouter()
+        self.api = AkinatorAPI()
+
+    async def initialize(self):
+        settings = await self.data.all()
+        self.sessions.global_limit = settings["global_limit"]
+        self.sessions.guild_limit = settings["guild_limit"]
+        self.sessions.idle_timeout = settings["idle_timeout"]
+
+    def cog_unload(self):
+        self.router.clear()
+        asyncio.create_task(self._close())
+
+    async def _close(self):
+        await self.sessions.close()
+        await self.api.close()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # The only listener of the games, answers are routed to the game waiting for them.
+        if message.author.bot or not self.router:
+            return
+        self.router.dispatch(message)
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
@@ -80,106 +121,223 @@ class AkinatorCog(commands.Cog, name="Akinator"):
         if not check.result:
             await ctx.send("See you later then! \N{WAVING HAND SIGN}")
             return
-        await ctx.send("Let's go!")
-        game_class = UserGame(ctx.author, ctx.channel, self.bot)
-        self.ongoing_games[ctx.author.id] = game_class
-        await ctx.send(
-            "Do you wish to set a specific language? If so, please specify it now (Find all "
-            "available language at <https://github.com/NinjaSnail1080/akinator.py#functions>) else "
-            "just say 'no'."
-        )
+        if self.sessions.is_playing(ctx.author.id):
+            await ctx.send("You're already playing with me!")
+            return
+        game_class = UserGame(ctx.author, ctx.channel, self.bot, self.router, self.api)
+        position = self.sessions.queue_position(game_class.guild_id)
+        if position:
+            await ctx.send(
+                "I'm already playing with a lot of people! You're #{pos} in the queue, I'll "
+                "tell you once it's your turn.".format(pos=position)
+            )
         try:
-            res = await self.bot.wait_for(
-                "message", timeout=60, check=MessagePredicate.same_context(ctx=ctx)
+            await self.sessions.add(game_class)
+        except AlreadyPlaying:
+            await ctx.send("You're already playing with me!")
+            return
+        except SessionLimitReached:
+            await ctx.send(
+                "Too many games are running right now, please try again in a few minutes."
             )
-        except asyncio.TimeoutError:
-            await ctx.send("You didn't answered in time... \N{PENSIVE FACE}")
             return
-        res = res.content.lower()
-        lang = res if res not in ("no", "n") else "en"
-        await game_class.start_akinator_game(language=lang)
         try:
-            del self.ongoing_games[ctx.author.id]
-        except KeyError:
-            pass
+            await ctx.send(
+                ("{mention}, let's go!" if position else "Let's go!").format(
+                    mention=ctx.author.mention
+                )
+            )
+            await ctx.send(
+                "Do you wish to set a specific language? If so, please specify it now (Find all "
+                "available language at <https://github.com/NinjaSnail1080/akinator.py#functions>) "
+                "else just say 'no'."
+            )
+            try:
+                res = await self.bot.wait_for(
+                    "message", timeout=60, check=MessagePredicate.same_context(ctx=ctx)
+                )
+            except asyncio.TimeoutError:
+                await ctx.send("You didn't answered in time... \N{PENSIVE FACE}")
+                return
+            res = res.content.lower()
+            lang = res if res not in ("no", "n") else "en"
+            if self.sessions.games.get(ctx.author.id) is not game_class:
+                return  # Cancelled while choosing the language.
+            game_class.touch()
+            await game_class.start_akinator_game(language=lang)
+        finally:
+            # Whatever happened, the game must not stay in the running games.
+            await self.sessions.release(game_class)
 
     @akinator.command()
     async def cancel(self, ctx: commands.Context):
         """Cancel your game with Akinator."""
-        if ctx.author.id not in self.ongoing_games:
+        game_class: Optional[UserGame] = self.sessions.games.get(ctx.author.id)
+        if not game_class:
             await ctx.send("You're not running any game!")
             return
-        game_class: UserGame = self.ongoing_games[ctx.author.id]
-        game_class.task.cancel()
-        self.ongoing_games.pop(ctx.author.id)
+        game_class.cancel()
+        await self.sessions.release(game_class)
+        await ctx.tick()
+
+    @akinator.command(name="sessions")
+    @commands.is_owner()
+    async def sessions_info(self, ctx: commands.Context):
+        """Show how many games are running."""
+        sessions = self.sessions
+        message = (
+            "Live games: {live}/{global_limit}\n"
+            "Peak since loaded: {peak}\n"
+            "Waiting in queue: {queued}\n"
+            "Limit per server: {guild_limit}\n"
+            "Idle timeout: {idle}s"
+        ).format(
+            live=sessions.live,
+            global_limit=sessions.global_limit,
+            peak=sessions.peak,
+            queued=sessions.queued,
+            guild_limit=sessions.guild_limit,
+            idle=int(sessions.idle_timeout),
+        )
+        if ctx.guild:
+            message += "\nLive games in this server: {count}".format(
+                count=sessions.guild_counts.get(ctx.guild.id, 0)
+            )
+        await ctx.send(box(message, lang="yaml"))
+
+    @akinator.command(name="apistats")
+    @commands.is_owner()
+    async def api_stats(self, ctx: commands.Context):
+        """Show the latency and the errors of the calls made to Akinator."""
+        message = ""
+        for name, metrics in self.api.metrics.items():
+            message += "{name}:\n".format(name=name)
+            if metrics.count:
+                message += (
+                    "  calls: {count}, mean {mean:.3f}s, p50 {p50:.3f}s, p95 {p95:.3f}s\n"
+                ).format(
+                    count=metrics.count,
+                    mean=metrics.mean,
+                    p50=metrics.percentile(50),
+                    p95=metrics.percentile(95),
+                )
+            else:
+                message += "  calls: 0\n"
+            message += "  retries: {retries}\n".format(retries=metrics.retries)
+            for error, count in metrics.errors.items():
+                message += "  {error}: {count}\n".format(error=error, count=count)
+        message += (
+            "guess picture prefetch:\n  used: {hits}, other guess: {stale}, "
+            "not ready: {pending}, not started: {misses}"
+        ).format(**self.api.prefetch)
+        await ctx.send(box(message, lang="yaml"))
+
+    @akinator.command(name="limits")
+    @commands.is_owner()
+    async def limits_setter(
+        self, ctx: commands.Context, global_limit: int, guild_limit: int, idle_timeout: int = 300
+    ):
+        """
+        Set how many games can run at once.
+
+        ``global_limit``: Games running at once on the bot.
+        ``guild_limit``: Games running at once in a server.
+        ``idle_timeout``: Seconds without answer before a game is stopped.
+        """
+        if global_limit < 1 or guild_limit < 1 or idle_timeout < 60:
+            await ctx.send("Limits must be at least 1, and the idle timeout at least 60 seconds.")
+            return
+        await self.data.global_limit.set(global_limit)
+        await self.data.guild_limit.set(guild_limit)
+        await self.data.idle_timeout.set(idle_timeout)
+        await self.initialize()
         await ctx.tick()
 
 
 class UserGame:
-    def __init__(self, user: discord.User, channel: discord.TextChannel, bot: Red):
+    def __init__(
+        self,
+        user: discord.User,
+        channel: discord.TextChannel,
+        bot: Red,
+        router: AnswerRouter,
+        api: AkinatorAPI,
+    ):
         self.user = user
         self.channel = channel
         self.bot = bot
+        self.router = router
+        self.api = api
+        self.guild_id: Optional[int] = channel.guild.id if hasattr(channel, "guild") else None
         self.akinator = Akinator()
         self.task = None
+        self.last_activity: float = time.monotonic()
         self.question = None
         self.prog = 80
+        # Akinator's guess and its picture start being fetched in the background above this
+        # progression.
+        self.prefetch_prog = 60
+        self.prefetch: Optional[Tuple[int, asyncio.Task]] = None  # (Step, Task)
+        # The Akinator object must not be used by two calls at once.
+        self._calls = asyncio.Lock()
         self.count = 1
 
     async def ask_question(self):
         await self.channel.send("Question #{num}: ".format(num=self.count) + str(self.question))
         received = await self.wait_for_input()
+        self.touch()
         return received
 
+    def touch(self):
+        """Mark the game as active, for the idle reaper."""
+        self.last_activity = time.monotonic()
+
+    def cancel(self):
+        """Stop waiting for the user, which ends the game."""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def close(self):
+        if self.prefetch:
+            self.prefetch[1].cancel()
+            self.prefetch = None
+        # The HTTP session is shared with the other games, it must not be closed.
+        self.akinator.client_session = None
+
     async def wait_for_input(self):
-        valid_answer = False
-        done = None  # Linters are lovely
-        answer = [
-            "yes",
-            "y",
-            "no",
-            "n",
-            "i",
-            "idk",
-            "i don't know",
-            "i dont know",
-            "probably",
-            "p",
-            "probably not",
-            "pn",
-            "0",
-            "1",
-            "2",
-            "3",
-            "4",
-            "b",
-        ]
-        while valid_answer is not True:
-            self.task = asyncio.create_task(
-                self.bot.wait_for(
-                    "message",
-                    check=MessagePredicate.lower_contained_in(
-                        collection=answer, user=self.user, channel=self.channel
-                    ),
-                    timeout=60,
-                )
-            )
-            try:
-                done = await self.task
-            except (asyncio.TimeoutError, asyncio.CancelledError):
-                return None
-            valid_answer = True
-        return done.content
+        return await self.wait_for_answer(ANSWERS)
+
+    async def wait_for_answer(self, choices: dict):
+        """Wait for one of the answers in ``choices`` and return its value.
+
+        Return None if the user did not answer in time or the game got cancelled.
+        """
+        self.task = self.router.expect(self.channel.id, self.user.id, choices)
+        try:
+            return await asyncio.wait_for(self.task, timeout=60)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            return None
+        finally:
+            self.router.forget(self.channel.id, self.user.id, self.task)
 
     async def start_akinator_game(self, language: str):
         if not self.question:
             try:
-                self.question = await self.akinator.start_game(
-                    language=language, child_mode=True if self.channel.nsfw else False
+                self.question = await self.api.call(
+                    "start_game",
+                    self.akinator.start_game,
+                    language=language,
+                    child_mode=True if self.channel.nsfw else False,
+                    client_session=self.api.session,
                 )
             except InvalidLanguageError:
                 await self.channel.send("Invalid language! Be sure it's written correctly.")
                 return None
+            except JSONDecodeError:
+                await self.channel.send(
+                    "Akinator is not answering right now, please try again later."
+                )
+                return None
 
         answer = await self.answer_questions()
 
@@ -194,15 +352,20 @@ class UserGame:
                 await self.channel.send("This is the end of the game.")
                 return False
 
-            if user_prompt in ("b", "back"):
+            if user_prompt == "back":
                 await self.go_back()
                 continue
 
             try:
-                self.question = await self.akinator.answer(user_prompt)
+                self.question = await self.call("answer", self.akinator.answer, user_prompt)
                 self.count += 1
+                self.start_prefetch()
             except JSONDecodeError:
-                await self.channel.send("An unexpected error happened.")
+                # Akinator's servers are overloaded, answers are not retried.
+                await self.channel.send(
+                    "Akinator's servers are overloaded and did not take your answer, please "
+                    "answer again."
+                )
             except AkiNoQuestions:
                 return True
         return True
@@ -210,25 +373,108 @@ class UserGame:
     async def go_back(self) -> str:
         """Go back to the latest question."""
         try:
-            self.question = await self.akinator.back()
+            self.question = await self.call("back", self.akinator.back)
             self.count -= 1
         except CantGoBackAnyFurther:
             await self.channel.send(
                 "Cannot go back any further! You will have to answer my question."
             )
+        except JSONDecodeError:
+            await self.channel.send(
+                "Akinator's servers are overloaded and did not go back, please try again."
+            )
         return self.question
 
-    async def determine_win(self):
-        await self.akinator.win()
-        await self.channel.send(embed=await self.make_guess_embed())
-        check = MessagePredicate.yes_or_no(channel=self.channel, user=self.user)
-        self.task = asyncio.create_task(self.bot.wait_for("message", check=check, timeout=60))
+    async def call(self, name: str, function, *args, **kwargs):
+        """Call one of the methods of the Akinator object once the previous call ended."""
+        async with self._calls:
+            return await self.api.call(name, function, *args, **kwargs)
+
+    def start_prefetch(self):
+        """Start fetching Akinator's guess and its picture while the user keeps answering.
+
+        Started once, by the first answer crossing ``prefetch_prog``. The leading guess rarely
+        changes past that point, so its picture is usually ready when the game ends.
+        """
+        if self.prefetch is not None or self.akinator.progression < self.prefetch_prog:
+            return
+        step = self.akinator.step
+        task = asyncio.create_task(self.prefetch_guess(step))
+        # Unused guesses are never awaited, their errors must not be reported as unretrieved.
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self.prefetch = (step, task)
+
+    async def prefetch_guess(self, step: int) -> Optional[Tuple[dict, Optional[bytes]]]:
+        async with self._calls:
+            if self.akinator.step != step:
+                # The user answered first, the next answer starts a new prefetch.
+                self.prefetch = None
+                return None
+            guess = dict(await self.api.call("win", self.akinator.win))
+        return guess, await self.fetch_picture(guess)
+
+    async def fetch_picture(self, guess: dict) -> Optional[bytes]:
+        """Download the picture of a guess, so Discord does not have to fetch it from
+        Akinator's servers once the guess is shown."""
         try:
-            await self.task
-        except (asyncio.TimeoutError, asyncio.CancelledError):
+            async with self.api.session.get(
+                guess["absolute_picture_path"], timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status != 200:
+                    return None
+                picture = b""
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    picture += chunk
+                    if len(picture) > MAX_PICTURE_SIZE:
+                        return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError):
+            return None
+        return picture
+
+    async def obtain_guess(self) -> Tuple[dict, Optional[bytes]]:
+        """Return Akinator's guess, with its picture if it was prefetched.
+
+        The picture is never downloaded here, a guess without it shows the picture's URL.
+        """
+        prefetched = None
+        if self.prefetch is None:
+            self.api.prefetch["misses"] += 1
+        else:
+            step, task = self.prefetch
+            self.prefetch = None
+            if not task.done():
+                task.cancel()
+                self.api.prefetch["pending"] += 1
+            elif task.cancelled() or task.exception():
+                self.api.prefetch["misses"] += 1
+            else:
+                prefetched = task.result()
+                if step == self.akinator.step:
+                    self.api.prefetch["hits"] += 1
+                    return prefetched
+        guess = dict(await self.call("win", self.akinator.win))
+        if prefetched:
+            old_guess, picture = prefetched
+            if old_guess.get("absolute_picture_path") == guess.get("absolute_picture_path"):
+                self.api.prefetch["hits"] += 1
+                return guess, picture
+            self.api.prefetch["stale"] += 1
+        return guess, None
+
+    async def determine_win(self):
+        guess, picture = await self.obtain_guess()
+        if picture:
+            await self.channel.send(
+                embed=await self.make_guess_embed(guess, picture=True),
+                file=discord.File(BytesIO(picture), filename="guess.jpg"),
+            )
+        else:
+            await self.channel.send(embed=await self.make_guess_embed(guess))
+        result = await self.wait_for_answer(YES_OR_NO)
+        if result is None:
             await self.channel.send("I hope I won then, at least. \N{WEARY FACE}")
             return
-        if check.result:
+        if result:
             await self.channel.send("I won! I'm so glad I guessed your mind!")
             return True
         await self.channel.send(
@@ -236,16 +482,18 @@ class UserGame:
         )
         return False
 
-    async def make_guess_embed(self):
+    async def make_guess_embed(self, guess: dict, picture: bool = False):
         embed = discord.Embed(
             title="Hmm... I think I've guessed...",
             description="Is it {name}? The description is {desc}.".format(
-                name=self.akinator.first_guess["name"],
-                desc=self.akinator.first_guess["description"],
+                name=guess["name"],
+                desc=guess["description"],
             ),
         )
         embed = randomize_colour(embed)
-        embed.set_image(url=self.akinator.first_guess["absolute_picture_path"])
+        embed.set_image(
+            url="attachment://guess.jpg" if picture else guess["absolute_picture_path"]
+        )
         embed.set_footer(
             icon_url=self.user.avatar_url,
             text=(
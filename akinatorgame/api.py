@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from json import JSONDecodeError
+from typing import Deque, Dict, Optional
+
+import aiohttp
+
+log = logging.getLogger("red.predeactor.akinator")
+
+CALLS = ("start_game", "answer", "back", "win")
+# Latencies kept for each kind of call, the percentiles are computed from them.
+LATENCY_SAMPLES = 500
+# Attempts made when Akinator answers with something that is not JSON, which happens when
+# its servers are overloaded. Answering or going back twice would skip a question, only the
+# calls that can safely be made again are retried.
+RETRIES = 3
+RETRIED_CALLS = ("start_game", "win")
+BACKOFF = 0.5  # Doubled after each attempt.
+
+
+class CallMetrics:
+    """Latency and errors of one kind of call to Akinator."""
+
+    __slots__ = ("latencies", "count", "total", "errors", "retries")
+
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.errors: Dict[str, int] = {}
+        self.retries: int = 0
+
+    def observe(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.count += 1
+        self.total += latency
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Return the given percentile of the last LATENCY_SAMPLES latencies."""
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+
+    def error(self, error: BaseException) -> None:
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class AkinatorAPI:
+    """Own the HTTP session shared by every game and measure the calls made to Akinator."""
+
+    def __init__(self):
+        self.metrics: Dict[str, CallMetrics] = {call: CallMetrics() for call in CALLS}
+        # How the picture of the guess was obtained when a game ended: prefetched, prefetched
+        # for another guess, still downloading, or not prefetched at all.
+        self.prefetch: Dict[str, int] = {"hits": 0, "stale": 0, "pending": 0, "misses": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The pooled session, connections are kept alive between the calls of every game."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=20),
+            )
+        return self._session
+
+    async def call(self, name: str, function, *args, **kwargs):
+        """Call one of the methods of an Akinator game, retrying start_game and win if the
+        response is invalid."""
+        metrics = self.metrics[name]
+        attempts = RETRIES if name in RETRIED_CALLS else 1
+        delay = BACKOFF
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                result = await function(*args, **kwargs)
+            except JSONDecodeError as e:
+                metrics.observe(time.perf_counter() - start)
+                metrics.error(e)
+                if attempt == attempts - 1:
+                    raise
+                metrics.retries += 1
+                log.debug("Invalid response from Akinator for {name}, retrying.".format(name=name))
+                await asyncio.sleep(delay)
+                delay *= 2
+            except Exception as e:
+                metrics.observe(time.perf_counter() - start)
+                metrics.error(e)
+                raise
+            else:
+                metrics.observe(time.perf_counter() - start)
+                return result
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import discord
+
+
+def build_aliases(choices: Mapping[Any, Tuple[str, ...]]) -> Dict[str, Any]:
+    """Build a map of every lowercase alias to the value it stands for."""
+    return {alias.lower(): value for value, aliases in choices.items() for alias in aliases}
+
+
+# Akinator's answers, by the ID akinator.py understands.
+ANSWERS = build_aliases(
+    {
+        "0": ("yes", "y", "0"),
+        "1": ("no", "n", "1"),
+        "2": ("i", "idk", "i don't know", "i dont know", "2"),
+        "3": ("probably", "p", "3"),
+        "4": ("probably not", "pn", "4"),
+        "back": ("b", "back"),
+    }
+)
+YES_OR_NO = build_aliases({True: ("yes", "y"), False: ("no", "n")})
+
+
+class AnswerRouter:
+    """Give the messages of the players to their game.
+
+    Games register what they expect from their player in a channel, the cog's only message
+    listener looks it up by (channel ID, user ID). The work done for each message does not
+    depend on the number of running games.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[Tuple[int, int], Tuple[asyncio.Future, Mapping[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def expect(self, channel_id: int, user_id: int, choices: Mapping[str, Any]) -> asyncio.Future:
+        """Return a future resolved with the value of the next valid answer of the user.
+
+        ``choices`` maps lowercase answers to the value the future is resolved with.
+        """
+        key = (channel_id, user_id)
+        previous = self._waiters.get(key)
+        if previous and not previous[0].done():
+            previous[0].cancel()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = (future, choices)
+        return future
+
+    def forget(self, channel_id: int, user_id: int, future: Optional[asyncio.Future] = None):
+        """Stop waiting for the user. Only remove ``future`` if given."""
+        key = (channel_id, user_id)
+        waiter = self._waiters.get(key)
+        if waiter and (future is None or waiter[0] is future):
+            del self._waiters[key]
+            if not waiter[0].done():
+                waiter[0].cancel()
+
+    def dispatch(self, message: discord.Message) -> bool:
+        """Resolve the future waiting for this message, if any. Return True if it was used."""
+        waiter = self._waiters.get((message.channel.id, message.author.id))
+        if waiter is None:
+            return False
+        future, choices = waiter
+        try:
+            value = choices[message.content.strip().lower()]
+        except KeyError:
+            return False
+        del self._waiters[message.channel.id, message.author.id]
+        if future.done():
+            return False
+        future.set_result(value)
+        return True
+
+    def clear(self) -> None:
+        for future, choices in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
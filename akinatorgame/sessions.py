@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .akinatorcog import UserGame
+
+log = logging.getLogger("red.predeactor.akinator")
+
+# Seconds between two checks of the idle games.
+REAP_INTERVAL = 30
+# Maximum number of players waiting for a free slot.
+MAX_QUEUE = 10
+# Seconds a player waits in the queue before giving up.
+QUEUE_TIMEOUT = 120
+
+
+class SessionLimitReached(Exception):
+    """Raised when a game cannot be started because too many games are running."""
+
+
+class AlreadyPlaying(Exception):
+    """Raised when a player already has a game, running or waiting in the queue."""
+
+
+class SessionManager:
+    """Keep track of the running games and limit how many Akinator sessions are open.
+
+    Games beyond the global or guild limit wait in a queue, or are rejected once the queue is
+    full. A single task checks the games every REAP_INTERVAL seconds and stops the ones that
+    have been idle for too long.
+    """
+
+    def __init__(self, global_limit: int, guild_limit: int, idle_timeout: float):
+        self.global_limit: int = global_limit
+        self.guild_limit: int = guild_limit
+        self.idle_timeout: float = idle_timeout
+
+        self.games: Dict[int, "UserGame"] = {}  # User ID: Game
+        self.guild_counts: Dict[int, int] = {}
+        self.peak: int = 0
+        self._queue: Deque[Tuple["UserGame", asyncio.Future]] = deque()
+        self._reaper: Optional[asyncio.Task] = None
+
+    @property
+    def live(self) -> int:
+        return len(self.games)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def is_playing(self, user_id: int) -> bool:
+        """Return if the player has a game running or waiting in the queue."""
+        return user_id in self.games or any(game.user.id == user_id for game, _ in self._queue)
+
+    def can_start(self, guild_id: Optional[int]) -> bool:
+        if self.live >= self.global_limit:
+            return False
+        return guild_id is None or self.guild_counts.get(guild_id, 0) < self.guild_limit
+
+    def queue_position(self, guild_id: Optional[int]) -> int:
+        """Return the position the player would get in the queue, 0 if he can play now."""
+        if self.can_start(guild_id):
+            return 0
+        return len(self._queue) + 1
+
+    async def add(self, game: "UserGame") -> None:
+        """Register a game, waiting for a free slot if needed.
+
+        Raises:
+            AlreadyPlaying: The player already has a game, running or queued.
+            SessionLimitReached: The queue is full or the player waited too long.
+        """
+        if self.is_playing(game.user.id):
+            raise AlreadyPlaying()
+        # Waiters are woken as soon as they can play, the ones left are blocked by a limit
+        # this game may not be blocked by.
+        if self.can_start(game.guild_id):
+            self._register(game)
+            return
+        if len(self._queue) >= MAX_QUEUE:
+            raise SessionLimitReached("The queue is full.")
+        future = asyncio.get_running_loop().create_future()
+        entry = (game, future)
+        self._queue.append(entry)
+        try:
+            # The game is registered by _wake_waiters before the future is resolved, so no
+            # other player can take the slot in the meantime.
+            await asyncio.wait_for(future, timeout=QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SessionLimitReached("Waited too long for a free slot.")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Registered just before the player stopped waiting, the slot is given back.
+                asyncio.create_task(self.release(game))
+            raise
+        finally:
+            if entry in self._queue:
+                self._queue.remove(entry)
+
+    def _register(self, game: "UserGame") -> None:
+        self.games[game.user.id] = game
+        if game.guild_id is not None:
+            self.guild_counts[game.guild_id] = self.guild_counts.get(game.guild_id, 0) + 1
+        self.peak = max(self.peak, self.live)
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def release(self, game: "UserGame") -> None:
+        """Remove a game and close its Akinator session. Can be called more than once."""
+        if self.games.get(game.user.id) is not game:
+            return
+        del self.games[game.user.id]
+        if game.guild_id is not None:
+            count = self.guild_counts.get(game.guild_id, 1) - 1
+            if count:
+                self.guild_counts[game.guild_id] = count
+            else:
+                self.guild_counts.pop(game.guild_id, None)
+        self._wake_waiters()
+        try:
+            await game.close()
+        except Exception as e:
+            log.error("Error while closing an Akinator session.", exc_info=e)
+
+    def _wake_waiters(self) -> None:
+        # Players are woken in order, a player whose guild is full lets the next one pass.
+        for game, future in list(self._queue):
+            if self.live >= self.global_limit:
+                break
+            if future.done() or not self.can_start(game.guild_id):
+                continue
+            self._queue.remove((game, future))
+            self._register(game)
+            future.set_result(None)
+
+    async def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for game, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+        for game in list(self.games.values()):
+            game.cancel()
+            await self.release(game)
+
+    async def _reap(self) -> None:
+        # Stops once there is no game left, restarted by the next register.
+        while self.games:
+            await asyncio.sleep(REAP_INTERVAL)
+            limit = time.monotonic() - self.idle_timeout
+            # Games without task did not start yet, the language prompt has its own timeout.
+            idle = [
+                game
+                for game in self.games.values()
+                if game.task is not None and game.last_activity < limit
+            ]
+            for game in idle:
+                log.debug("Reaping idle Akinator game of {user}.".format(user=game.user.id))
+                game.cancel()
+                try:
+                    await self.release(game)
+                except Exception as e:
+                    log.error("Error while reaping an Akinator game.", exc_info=e)
@@ -0,0 +1,157 @@
+"""
+Measure the memory held by open Captcha challenges.
+
+Run it from the root of the repository, in the environment where Red is installed:
+
+    python -m benchmarks.challenge_footprint [number_of_challenges]
+
+Challenges are measured once set up like an open challenge: the captcha is created and the
+three tasks waiting for the member are running. Both layouts get the same settings dict, the
+copy of the settings Config used to return for each challenge is measured on its own.
+
+Message objects are not created, the legacy layout would keep up to three of them alive for
+each challenge, so its real footprint is higher than what is shown.
+"""
+
+import asyncio
+import copy
+import sys
+import tracemalloc
+from types import SimpleNamespace
+
+import discapty
+from redbot.core.utils.predicates import MessagePredicate
+
+from captcha.api import Challenge
+from captcha.base import DEFAULT_GUILD
+from captcha.metrics import CaptchaMetrics
+from captcha.scheduler import TimeoutScheduler
+
+MIB = 1024 * 1024
+SETTINGS = {**DEFAULT_GUILD, "channel": 133251234164375552, "enabled": True, "autoroles": [1, 2]}
+
+
+class LegacyChallenge:
+    """The attributes Challenge had before using slots, kept for comparison."""
+
+    def __init__(self, cog, member, data: dict):
+        self.bot = cog.bot
+        self.member = member
+        self.guild = member.guild
+        self.config = data
+        self.channel = cog.bot.get_channel(data["channel"])
+        self.type = data["type"]
+        self.messages = dict()
+        self.log = cog.send_or_update_log_message
+        self.running = False
+        self.tasks = []
+        self.limit = data["retry"]
+        self.trynum = 0
+        self.captcha = discapty.Captcha(self.type)
+
+    def setup(self):
+        # What wait_for_action started with _give_me_tasks. The reload check was a
+        # ReactionPredicate on the captcha's message, which is not created here.
+        def reload_check(r, u):
+            return u.id == self.member.id and str(r.emoji) == "🔁"
+
+        def leave_check(u):
+            return u.id == self.member.id
+
+        self.tasks = [
+            asyncio.create_task(self.bot.wait_for("reaction_add", check=reload_check)),
+            asyncio.create_task(
+                self.bot.wait_for(
+                    "message",
+                    check=MessagePredicate.same_context(channel=self.channel, user=self.member),
+                )
+            ),
+            asyncio.create_task(self.bot.wait_for("user_remove", check=leave_check)),
+        ]
+
+    def cancel_tasks(self):
+        for task in self.tasks:
+            task.cancel()
+
+
+class FakeBot:
+    def __init__(self):
+        self.never = asyncio.get_running_loop().create_future()
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def wait_for(self, event, *, check=None, timeout=None):
+        return await self.never
+
+
+class FakeCog:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.metrics = CaptchaMetrics()
+        self.scheduler = TimeoutScheduler(lambda keys: None)
+
+    async def send_or_update_log_message(self, *args, **kwargs):
+        pass
+
+
+def setup_challenge(challenge: Challenge) -> Challenge:
+    challenge.captcha  # Created on first use.
+    challenge._refresh_tasks()
+    return challenge
+
+
+async def measure(factory, members) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    challenges = [factory(member) for member in members]
+    await asyncio.sleep(0)  # The tasks start waiting.
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for challenge in challenges:
+        challenge.cancel_tasks()
+    await asyncio.sleep(0)
+    del challenges
+    return used / len(members)
+
+
+def settings_copy_size(number: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = [copy.deepcopy(SETTINGS) for _ in range(number)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del copies
+    return used / number
+
+
+def legacy_factory(cog, member):
+    challenge = LegacyChallenge(cog, member, SETTINGS)
+    challenge.setup()
+    return challenge
+
+
+async def main(number: int):
+    cog = FakeCog()
+    guild = SimpleNamespace(id=1, name="Raided guild")
+    members = [SimpleNamespace(id=i, guild=guild, name=str(i)) for i in range(number)]
+
+    legacy = await measure(lambda m: legacy_factory(cog, m), members)
+    compact = await measure(lambda m: setup_challenge(Challenge(cog, m, SETTINGS)), members)
+    # Config.all() returned a new copy of the settings for every challenge, they are now
+    # shared by the challenges of a guild.
+    settings = settings_copy_size(number)
+
+    print("Open challenges: {num}".format(num=number))
+    print("Before: {size:.0f} bytes per challenge".format(size=legacy))
+    print("After:  {size:.0f} bytes per challenge".format(size=compact))
+    print("Settings copy no longer made: {size:.0f} bytes per challenge".format(size=settings))
+    print(
+        "100k challenges: {before:.1f} MiB -> {after:.1f} MiB".format(
+            before=(legacy + settings) * 100_000 / MIB, after=compact * 100_000 / MIB
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
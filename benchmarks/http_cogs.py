@@ -0,0 +1,298 @@
+"""
+Measure the command latency and the connection reuse of the cogs calling HTTP APIs, against
+the local servers of benchmarks.mock_upstreams. No network access is needed.
+
+Run it from the root of the repository, in the environment where Red is installed:
+
+    python -m benchmarks.http_cogs [commands_per_case] [latency_ms] [failure_rate]
+
+Each case runs its commands 10 at a time. Failures are injected with the given rate in a
+second pass, using every failure the route supports in turn. "errors" counts commands
+raising an exception; failures the cog reports to the user are expected and not counted.
+The Lyrics cases are skipped if ksoftapi is not installed, its cache and index are kept in
+the temporary directory.
+"""
+
+import asyncio
+import secrets
+import sys
+import tempfile
+import time
+from statistics import mean
+from types import SimpleNamespace
+
+from redbot.core import data_manager, drivers
+
+from benchmarks.mock_upstreams import FAILURES, MockUpstreams
+
+CONCURRENCY = 10
+# The smallest valid PNG file.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class Typing:
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, content: str = "", attachments=()):
+        self.content = content
+        self.attachments = list(attachments)
+
+    async def delete(self):
+        pass
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = "user{id}".format(id=user_id)
+        self.mention = "<@{id}>".format(id=user_id)
+        self.avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    async def send(self, *args, **kwargs):
+        return FakeMessage()
+
+
+class FakeChannel:
+    id = 1
+
+    def permissions_for(self, member):
+        return SimpleNamespace(embed_links=True)
+
+
+class FakeContext:
+    """Just enough of a command context for the commands measured here."""
+
+    def __init__(self, bot, user_id: int, message: FakeMessage = None):
+        self.bot = bot
+        self.author = FakeUser(user_id)
+        self.channel = FakeChannel()
+        self.guild = None
+        self.me = None
+        self.message = message or FakeMessage()
+        self.command = SimpleNamespace(reset_cooldown=lambda ctx: None)
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content if content is not None else kwargs.get("embed"))
+        return FakeMessage()
+
+    maybe_send_embed = send
+
+    def typing(self):
+        return Typing()
+
+    async def embed_color(self):
+        return 0
+
+    async def embed_requested(self):
+        return True
+
+
+class FakeBot:
+    def __init__(self, upstreams: MockUpstreams):
+        self.tokens = {
+            "travitia": {"api_key": upstreams.api_key},
+            "sxcu": {"url": upstreams.sxcu_url},
+            "ksoftsi": {"api_key": upstreams.api_key},
+        }
+
+    async def get_shared_api_tokens(self, service: str):
+        return dict(self.tokens.get(service, {}))
+
+    async def set_shared_api_tokens(self, service: str, **tokens):
+        self.tokens.setdefault(service, {}).update(tokens)
+
+    async def get_embed_colour(self, location):
+        return 0
+
+    async def wait_for(self, event, *, check=None, timeout=None):
+        return FakeMessage("0")  # Choose the first song.
+
+
+async def run_case(upstreams: MockUpstreams, command, number: int):
+    """Run ``command(index)`` ``number`` times, CONCURRENCY at once."""
+    upstreams.reset_stats()
+    durations, errors = [], 0
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await command(index)
+            except Exception:
+                errors += 1
+            durations.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(index) for index in range(number)))
+    durations.sort()
+    return {
+        "mean": mean(durations),
+        "p95": durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+        "requests": sum(upstreams.requests.values()),
+        "connections": len(upstreams.connections),
+        "injected": sum(upstreams.injected.values()),
+        "errors": errors,
+    }
+
+
+def row(name: str, result: dict) -> str:
+    return (
+        "{name:<42}{mean:>9.1f} ms{p95:>9.1f} ms{requests:>10}{connections:>13}"
+        "{injected:>10}{errors:>8}"
+    ).format(name=name, **{**result, "mean": result["mean"] * 1000, "p95": result["p95"] * 1000})
+
+
+async def make_cases(upstreams: MockUpstreams, bot: FakeBot):
+    """Return (name, route, command, cleanup) for every case."""
+    cases = []
+
+    from cleverbot.asynccleverbot import cleverbot as ac
+    from cleverbot.cleverbot import CleverBot
+
+    ac.API_URL = upstreams.travitia_url
+    cleverbot = CleverBot(bot)
+
+    async def legacy_ask(index: int):
+        # What the ask command did with its own session for each question.
+        client = ac.Cleverbot(upstreams.api_key, context=ac.DictContext())
+        try:
+            await client.ask("Hello there {index}".format(index=index), index)
+        finally:
+            await client.close()
+
+    async def ask(index: int):
+        ctx = FakeContext(bot, index)
+        await cleverbot.ask.callback(
+            cleverbot, ctx, question="Hello there {index}".format(index=index)
+        )
+
+    cases.append(("cleverbot ask (session/call)", "talk", legacy_ask, None))
+    cases.append(("cleverbot ask", "talk", ask, cleverbot._close_session))
+
+    from miku import mikuapi
+
+    mikuapi.BASE_URL = upstreams.cacti_url
+    miku = mikuapi.Miku(bot)
+
+    async def cacti(index: int):
+        await miku.cacti.callback(miku, FakeContext(bot, index))
+
+    cases.append(("miku cacti", "cacti", cacti, None))
+
+    from sxcu.commands import Commands as SXCU
+
+    sxcu = SXCU(bot)
+
+    async def shorten(index: int):
+        ctx = FakeContext(bot, index)
+        await sxcu._shorten_command_logic(ctx, "https://example.com/{index}".format(index=index))
+
+    async def upload(index: int):
+        attachment = SimpleNamespace(read=lambda: asyncio.sleep(0, PNG))
+        ctx = FakeContext(bot, index, FakeMessage(attachments=[attachment]))
+        await sxcu._image_upload_command_logic(ctx)
+
+    cases.append(("sxcu shorten", "shorten", shorten, None))
+    cases.append(("sxcu upload", "upload", upload, None))
+
+    try:
+        import ksoftapi
+    except ImportError:
+        print("ksoftapi is not installed, skipping Lyrics.")
+    else:
+        from lyrics.lyrics import Lyrics
+
+        lyrics = Lyrics(bot)
+        lyrics.client = ksoftapi.Client(upstreams.api_key)
+        lyrics.client.http.BASE = upstreams.ksoft_url
+        # sys.version spans several lines, aiohttp's server refuses the header.
+        headers = lyrics.client.http._default_headers
+        headers["X-Powered-By"] = " ".join(headers["X-Powered-By"].split())
+        # The mock has no quota, only the HTTP calls are measured.
+        lyrics.scheduler.rate = lyrics.scheduler.burst = 1000
+
+        async def search(index: int):
+            # A new song every time, so KSoft is called instead of the cache and the index.
+            ctx = FakeContext(bot, index)
+            name = "song {name}".format(name=secrets.token_hex(4))
+            await lyrics.lyrics.callback(lyrics, ctx, song_name=name)
+
+        async def cached_search(index: int):
+            ctx = FakeContext(bot, index)
+            await lyrics.lyrics.callback(
+                lyrics, ctx, song_name="song {index}".format(index=index % 10)
+            )
+
+        async def close_lyrics():
+            await lyrics.client.close()
+            await lyrics.index.close()
+            lyrics.scheduler.close()
+
+        cases.append(("lyrics", "lyrics", search, None))
+        cases.append(("lyrics (10 songs, cached)", "lyrics", cached_search, close_lyrics))
+    return cases
+
+
+async def main(number: int, latency: float, failure_rate: float):
+    # Config of the cogs is kept in a temporary directory.
+    data_manager.basic_config = {
+        "DATA_PATH": tempfile.mkdtemp(),
+        "COG_PATH_APPEND": "cogs",
+        "CORE_PATH_APPEND": "core",
+        "STORAGE_TYPE": "JSON",
+        "STORAGE_DETAILS": {},
+    }
+    data_manager.instance_name = "benchmark"
+    await drivers.get_driver_class().initialize()
+
+    upstreams = MockUpstreams(latency=latency, seed=0)
+    await upstreams.start()
+    bot = FakeBot(upstreams)
+    cases = await make_cases(upstreams, bot)
+    header = "{:<42}{:>12}{:>12}{:>10}{:>13}{:>10}{:>8}".format(
+        "case", "mean", "p95", "requests", "connections", "injected", "errors"
+    )
+    try:
+        print(
+            "{number} commands per case, {concurrency} at once, {latency:.0f} ms of latency.".format(
+                number=number, concurrency=CONCURRENCY, latency=latency * 1000
+            )
+        )
+        print(header)
+        for name, route, command, cleanup in cases:
+            print(row(name, await run_case(upstreams, command, number)))
+        if failure_rate:
+            print("\nWith {rate:.0%} of failures:".format(rate=failure_rate))
+            print(header)
+            for name, route, command, cleanup in cases:
+                for failure in FAILURES[route]:
+                    upstreams.inject(route, failure, failure_rate)
+                    result = await run_case(upstreams, command, number)
+                    print(row("{name} ({failure})".format(name=name, failure=failure), result))
+                upstreams.inject(route, failure, 0)
+    finally:
+        for name, route, command, cleanup in cases:
+            if cleanup is not None:
+                await cleanup()
+        await upstreams.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+            float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02,
+            float(sys.argv[3]) if len(sys.argv) > 3 else 0.1,
+        )
+    )
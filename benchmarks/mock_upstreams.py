@@ -0,0 +1,310 @@
+"""
+Local stand-ins for the APIs used by Cleverbot (Travitia), Miku (cacti-api), SXCU and Lyrics
+(KSoft.Si), so the cogs can be exercised without network access.
+
+Every API answers like the real one, including its error codes. Latency and failures can be
+injected for each route. Start the servers alone with:
+
+    python -m benchmarks.mock_upstreams [--port 8080] [--latency 0.05] [--failure 503:0.1]
+
+The cogs are then pointed at the printed URLs.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import secrets
+from collections import Counter
+from typing import Dict, Optional, Set, Tuple
+
+from aiohttp import web
+
+ROUTES = ("talk", "cacti", "upload", "shorten", "lyrics")
+# Failures each route can be made to return. "malformed" is a body that is not valid JSON.
+FAILURES = {
+    "talk": ("503", "malformed"),
+    "cacti": ("503", "malformed"),
+    "upload": ("503", "407", "403", "415", "malformed"),
+    "shorten": ("503", "malformed"),
+    "lyrics": ("503", "403", "malformed"),
+}
+# Magic numbers of the files SXCU accepts.
+IMAGE_SIGNATURES = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",
+    b"GIF8",
+    b"II*\x00",
+    b"MM\x00*",
+    b"\x00\x00\x01\x00",
+    b"BM",
+    b"\x1aE\xdf\xa3",
+)
+LYRICS = "\n".join(
+    "Line {number} of a song that only exists on this server.".format(number=number)
+    for number in range(1, 31)
+)
+
+
+class MockUpstreams:
+    """One aiohttp server answering for every API.
+
+    Parameters:
+        latency: Seconds each request waits before its answer.
+        jitter: Random seconds added to the latency, up to this value.
+        api_key: Key expected by Travitia and KSoft.Si.
+        sxcu_token: Token expected by the SXCU upload, None if the subdomain is public.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        api_key: str = "mock-key",
+        sxcu_token: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.api_key: str = api_key
+        self.sxcu_token: Optional[str] = sxcu_token
+
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.connections: Set[Tuple[str, int]] = set()
+        self._failures: Dict[str, Tuple[str, float]] = {}
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    # URLs given to the cogs.
+
+    @property
+    def travitia_url(self) -> str:
+        return self.url + "/talk"
+
+    @property
+    def cacti_url(self) -> str:
+        return self.url + "/cacti"
+
+    @property
+    def sxcu_url(self) -> str:
+        return self.url + "/sxcu"  # The cog adds /upload and /shorten.
+
+    @property
+    def ksoft_url(self) -> str:
+        return self.url + "/ksoft"  # ksoftapi adds /lyrics/search.
+
+    def inject(self, route: str, failure: str, rate: float = 1.0) -> None:
+        """Make a proportion of the requests of a route fail. A rate of 0 removes it."""
+        if failure not in FAILURES[route]:
+            raise ValueError(
+                "{route} cannot return {failure}.".format(route=route, failure=failure)
+            )
+        if rate <= 0:
+            self._failures.pop(route, None)
+        else:
+            self._failures[route] = (failure, rate)
+
+    def reset_stats(self) -> None:
+        self.requests.clear()
+        self.injected.clear()
+        self.connections.clear()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start the server, port 0 picks a free one. Return its URL."""
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes(
+            [
+                web.post("/talk", self._talk, name="talk"),
+                web.get("/cacti", self._cacti, name="cacti"),
+                web.post("/sxcu/upload", self._upload, name="upload"),
+                web.post("/sxcu/shorten", self._shorten, name="shorten"),
+                web.get("/ksoft/lyrics/search", self._lyrics, name="lyrics"),
+            ]
+        )
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = "http://{host}:{port}".format(host=host, port=port)
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        route = request.match_info.route.name
+        self.requests[route] += 1
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer:
+            self.connections.add(peer[:2])
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        failure = self._failures.get(route)
+        if failure and self._random.random() < failure[1]:
+            self.injected[route, failure[0]] += 1
+            return self._failure(route, failure[0])
+        return await handler(request)
+
+    @staticmethod
+    def _failure(route: str, failure: str) -> web.Response:
+        if failure == "malformed":
+            if route in ("talk", "cacti"):
+                # Heroku and Cloudflare error pages.
+                return web.Response(
+                    text="<html>Application error</html>", content_type="text/html"
+                )
+            return web.Response(text='{"url": "http://', content_type="application/json")
+        status = int(failure)
+        if route == "lyrics":
+            return web.json_response(
+                {"error": True, "code": status, "message": "Forbidden"}, status=status
+            )
+        if status == 503 and route != "upload":
+            return web.Response(text="Service Unavailable", status=status)
+        return web.json_response({"error": "Injected failure."}, status=status)
+
+    # Travitia
+
+    async def _talk(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        if request.headers.get("authorization") != self.api_key:
+            return web.json_response({"error": "Invalid authorization credentials"}, status=401)
+        text = data.get("text", "")
+        return web.json_response(
+            {"response": "You said {length} characters.".format(length=len(text)), "status": 200}
+        )
+
+    # cacti-api
+
+    async def _cacti(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"url": "https://example.com/miku/{name}.png".format(name=secrets.token_hex(4))}
+        )
+
+    # SXCU
+
+    async def _upload(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        token = data.get("token")
+        if self.sxcu_token is not None:
+            if token is None:
+                return web.json_response({"error": "A token is required."}, status=407)
+            if token != self.sxcu_token:
+                return web.json_response({"error": "Invalid token."}, status=403)
+        image = data.get("image")
+        content = image.file.read() if isinstance(image, web.FileField) else image
+        if isinstance(content, str):
+            content = content.encode()
+        if not content or not content.startswith(IMAGE_SIGNATURES):
+            return web.json_response({"error": "File type not allowed."}, status=415)
+        return web.json_response(self._links(request, thumb=True))
+
+    async def _shorten(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        if not data.get("link"):
+            return web.json_response({"error": "No link given."}, status=400)
+        return web.json_response(self._links(request))
+
+    def _links(self, request: web.Request, thumb: bool = False) -> dict:
+        name = secrets.token_urlsafe(6)
+        links = {
+            "url": "{base}/{name}".format(base=self.sxcu_url, name=name),
+            "del_url": "{base}/d/{name}/{key}".format(
+                base=self.sxcu_url, name=name, key=secrets.token_hex(8)
+            ),
+        }
+        if thumb:
+            links["thumb"] = "{base}/t/{name}.png".format(base=self.sxcu_url, name=name)
+        return links
+
+    # KSoft.Si
+
+    async def _lyrics(self, request: web.Request) -> web.Response:
+        if request.headers.get("Authorization") != "Bearer " + self.api_key:
+            return web.json_response(
+                {"error": True, "code": 401, "message": "Token is invalid."}, status=401
+            )
+        query = request.query.get("q", "")
+        limit = int(request.query.get("limit", 10))
+        results = [self._song(query, index) for index in range(min(limit, 3))]
+        return web.json_response({"total": len(results), "took": 1, "data": results})
+
+    @staticmethod
+    def _song(query: str, index: int) -> dict:
+        return {
+            "artist": "Mock Artist {index}".format(index=index),
+            "artist_id": index,
+            "album": "Mock Album",
+            "album_ids": str(index),
+            "album_year": "2020",
+            "name": "{query} ({index})".format(query=query.title(), index=index),
+            "lyrics": LYRICS,
+            "search_str": query,
+            "album_art": "https://cdn.ksoft.si/images/Logo1024%20-%20W.png",
+            "popularity": 10 - index,
+            "singalong": [],
+            "meta": {},
+            "id": secrets.token_hex(8),
+            "search_score": 1.0 - index / 10,
+            "url": "https://example.com/lyrics/{index}".format(index=index),
+        }
+
+
+def parse_failure(value: str) -> Tuple[str, float]:
+    failure, _, rate = value.partition(":")
+    return failure, float(rate or 1)
+
+
+async def serve(arguments: argparse.Namespace) -> None:
+    upstreams = MockUpstreams(
+        latency=arguments.latency, jitter=arguments.jitter, sxcu_token=arguments.sxcu_token
+    )
+    for failure, rate in arguments.failure:
+        for route in ROUTES:
+            if failure in FAILURES[route]:
+                upstreams.inject(route, failure, rate)
+    await upstreams.start(arguments.host, arguments.port)
+    print(
+        json.dumps(
+            {
+                "travitia": upstreams.travitia_url,
+                "cacti": upstreams.cacti_url,
+                "sxcu": upstreams.sxcu_url,
+                "ksoft": upstreams.ksoft_url,
+                "api_key": upstreams.api_key,
+            },
+            indent=4,
+        )
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstreams.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds.")
+    parser.add_argument("--sxcu-token", default=None, help="Token required by the upload.")
+    parser.add_argument(
+        "--failure",
+        type=parse_failure,
+        action="append",
+        default=[],
+        help="Failure injected in every route supporting it, as NAME[:RATE], e.g. 503:0.1.",
+    )
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
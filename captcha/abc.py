@@ -7,6 +7,14 @@ from redbot.core.bot import Red
 from redbot.core.commands import Cog
 
 from .api import Challenge
+from .cleanup import MessageCleaner
+from .images import CaptchaRenderer
+from .journal import AuditJournal
+from .metrics import CaptchaMetrics
+from .moderation import ModerationExecutor
+from .permissions import PermissionCache
+from .registry import ChallengeRegistry
+from .scheduler import TimeoutScheduler
 
 
 class MixinMeta(ABC):
@@ -15,6 +23,14 @@ class MixinMeta(ABC):
 
         self.data: Config
         self.running: dict
+        self.metrics: CaptchaMetrics
+        self.scheduler: TimeoutScheduler
+        self.moderation: ModerationExecutor
+        self.cleaner: MessageCleaner
+        self.renderer: CaptchaRenderer
+        self.permissions: PermissionCache
+        self.registry: ChallengeRegistry
+        self.journal: AuditJournal
 
         self.version: str
         self.patchnote: str
@@ -41,6 +57,14 @@ class MixinMeta(ABC):
     async def delete_challenge_for(self, member: Union[discord.Member, int]) -> bool:
         raise NotImplementedError()
 
+    @abstractmethod
+    async def _load_registry(self) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def is_challenged(self, member: discord.Member) -> bool:
+        raise NotImplementedError()
+
     @abstractmethod
     def is_running_challenge(self, member_or_id: Union[discord.Member, int]):
         raise NotImplementedError()
@@ -70,7 +94,7 @@ class MixinMeta(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    async def nicely_kick_user_from_challenge(self, challenge: Challenge, reason: str):
+    async def nicely_kick_user_from_challenge(self, challenge: Challenge, reason: str) -> str:
         raise NotImplementedError()
 
     @abstractmethod
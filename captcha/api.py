@@ -1,14 +1,16 @@
 import asyncio
 import logging
-from typing import Union
+import time
+from typing import Optional, Union
 
 import discapty
 import discord
 from redbot.core.bot import Red
 from redbot.core.utils import chat_formatting as form
-from redbot.core.utils.predicates import MessagePredicate, ReactionPredicate
+from redbot.core.utils.predicates import MessagePredicate
 
 from .errors import AskedForReload, LeftServerError, MissingRequiredValueError
+from .registry import LEASE_MARGIN
 
 log = logging.getLogger("red.predeactor.captcha")
 
@@ -18,37 +20,101 @@ def ok_check(msg: str):
 
 
 class Challenge:
-    """Representation of a challenge an user is doing."""
-
-    def __init__(self, bot: Red, member: discord.Member, data: dict):
-        self.bot: Red = bot
-
-        self.member: discord.Member = member
-        self.guild: discord.Guild = member.guild
-        self.config: dict = data  # Will contain the config of the guild.
-
-        if not self.config["channel"]:
+    """Representation of a challenge an user is doing.
+
+    Slots are used since a raid can open thousands of challenges at once. The guild's settings
+    are shared with the other challenges of the guild, messages are stored by their ID and the
+    captcha is only created when it's needed.
+    """
+
+    __slots__ = (
+        "cog",
+        "member",
+        "config",
+        "bot_message_id",
+        "answer_id",
+        "log_message",
+        "running",
+        "tasks",
+        "expired",
+        "trynum",
+        "started_at",
+        "_reaction_message_id",
+        "_captcha",
+    )
+
+    def __init__(self, cog, member: discord.Member, settings: dict):
+        """
+        Parameters:
+            cog: The Captcha cog. The bot is still accepted, as it used to be, the cog is then
+             obtained from it.
+            member: discord.Member, The member to challenge.
+            settings: dict, The guild's settings. It is shared between challenges and must not
+             be modified.
+        """
+        if not settings["channel"]:
             raise MissingRequiredValueError("Missing channel for verification.")
-        self.channel: Union[discord.TextChannel, discord.DMChannel] = (
-            bot.get_channel(self.config["channel"])
-            if self.config.get("channel") != "dm"
-            else self.member.dm_channel
-        )
 
-        self.type: str = self.config["type"]
+        if isinstance(cog, Red):
+            cog = cog.get_cog("Captcha")
+        self.cog = cog
+        self.member: discord.Member = member
+        self.config: dict = settings
 
-        self.messages: dict = dict()
-        # bot_challenge: Message send for the challenge, contain captcha.
-        # logs: The message that has been sent in the logging channel.
-        # answer: Member's answer to captcha, may or may not exist.
-        self.log = bot.get_cog("Captcha").send_or_update_log_message
+        self.bot_message_id: Optional[int] = None  # Message containing the captcha.
+        self.answer_id: Optional[int] = None  # Member's answer, may or may not exist.
+        # Kept as a message since its content is needed to update it.
+        self.log_message: Optional[discord.Message] = None
 
         self.running: bool = False
-        self.tasks: list = []
-        self.limit: int = self.config["retry"]
+        self.tasks: Optional[dict] = None
+        # Resolved by the cog's scheduler once the deadline of the challenge expired.
+        self.expired: Optional[asyncio.Future] = None
         self.trynum: int = 0
+        self.started_at: float = time.monotonic()
+
+        self._reaction_message_id: Optional[int] = None
+        self._captcha: Optional[discapty.Captcha] = None
+
+    @property
+    def bot(self) -> Red:
+        return self.cog.bot
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.member.guild
 
-        self.captcha: discapty.Captcha = discapty.Captcha(self.type)
+    @property
+    def channel(self) -> Union[discord.TextChannel, discord.DMChannel]:
+        if self.config["channel"] == "dm":
+            return self.member.dm_channel
+        return self.bot.get_channel(self.config["channel"])
+
+    @property
+    def type(self) -> str:
+        return self.config["type"]
+
+    @property
+    def limit(self) -> int:
+        return self.config["retry"]
+
+    @property
+    def log(self):
+        return self.cog.send_or_update_log_message
+
+    @property
+    def metrics(self):
+        return self.cog.metrics.guild(self.member.guild.id)
+
+    @property
+    def scheduler(self):
+        return self.cog.scheduler
+
+    @property
+    def captcha(self) -> discapty.Captcha:
+        if self._captcha is None:
+            self._captcha = discapty.Captcha(self.type)
+        return self._captcha
 
     async def try_challenging(self) -> bool:
         """Do challenging in one function!
@@ -61,16 +127,16 @@ class Challenge:
         if self.running is True:
             raise OverflowError("A Challenge is already running.")
 
-        if self.messages.get("bot_challenge"):
+        if self.bot_message_id:
             await self.reload()
         else:
             await self.send_basics()
 
         self.running = True
-        self.messages["logs"] = logmsg = await self.log(
+        self.log_message = logmsg = await self.log(
             self.guild,
             form.info("The member started the challenge."),
-            self.messages.get("logs", None),
+            self.log_message,
             allowed_tries=(self.trynum, self.limit),
             member=self.member,
         )
@@ -81,7 +147,7 @@ class Challenge:
                 raise LeftServerError("User has left guild.")
             if hasattr(received, "content"):
                 # It's a message!
-                self.messages["answer"] = received
+                self.answer_id = received.id
                 error_message = ""
                 try:
                     state = await self.verify(received.content)
@@ -125,11 +191,13 @@ class Challenge:
         """
         Send the message containing the captcha code.
         """
-        if self.messages.get("bot_challenge"):
+        if self.bot_message_id:
             raise OverflowError("Use 'Challenge.reload' to create another code.")
 
-        embed_and_file = await self.captcha.generate_embed(
-            guild_name=self.guild.name,
+        start = time.perf_counter()
+        embed_and_file = await self.cog.renderer.generate_embed(
+            self.captcha,
+            self.config,
             author={"name": f"Captcha for {self.member.name}", "url": self.member.avatar_url},
             footer={"text": f"Tries: {self.trynum} / Limit: {self.limit}"},
             title=f"{self.guild.name} Verification System",
@@ -138,6 +206,7 @@ class Challenge:
                 "characters."
             ),
         )
+        self.metrics.render_time.observe(time.perf_counter() - start)
 
         try:
             await asyncio.sleep(1)
@@ -149,7 +218,7 @@ class Challenge:
             )
         except discord.Forbidden:
             raise PermissionError("Cannot send message in verification channel.")
-        self.messages["bot_challenge"] = bot_message
+        self.bot_message_id = bot_message.id
         try:
             await bot_message.add_reaction("🔁")
         except discord.Forbidden:
@@ -160,44 +229,56 @@ class Challenge:
 
         It will return an object of discord.Message or discord.Reaction depending what the user
         did.
+        The deadline is given to the cog's scheduler instead of using a timeout, and the tasks
+        that are still waiting are kept for the next try.
         """
-        self.cancel_tasks()  # Just in case...
-        self.tasks = self._give_me_tasks()
-        done, pending = await asyncio.wait(
-            self.tasks,
-            timeout=self.config["timeout"] * 60,
-            return_when=asyncio.FIRST_COMPLETED,
-        )
-        self.cancel_tasks()
-        if len(done) == 0:
-            raise TimeoutError("User didn't answer.")
-        try:  # An error is raised if we return the result and when the task got cancelled.
-            return done.pop().result()
-        except asyncio.CancelledError:
-            return None
+        tasks = self._refresh_tasks()
+        if self.expired is None or self.expired.done():
+            self.expired = asyncio.get_running_loop().create_future()
+        delay = self.config["timeout"] * 60
+        self.scheduler.schedule(self.member.id, delay)
+        await self.cog.registry.extend(self.guild.id, self.member.id, delay + LEASE_MARGIN)
+        try:
+            await asyncio.wait(
+                [*tasks.values(), self.expired], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            self.scheduler.cancel(self.member.id)
+        for name, task in list(tasks.items()):
+            if not task.done():
+                continue
+            del tasks[name]
+            try:  # An error is raised if we return the result and when the task got cancelled.
+                return task.result()
+            except asyncio.CancelledError:
+                return None
+        raise TimeoutError("User didn't answer.")
+
+    def record(self, event: str, **details) -> None:
+        """Add an event of this challenge to the cog's audit journal."""
+        self.cog.journal.record(event, self.guild.id, self.member.id, **details)
+
+    def expire(self) -> None:
+        """Make the ongoing ``wait_for_action`` raise a TimeoutError."""
+        if self.expired is not None and not self.expired.done():
+            self.expired.set_result(None)
 
     async def reload(self) -> None:
         """
         Resend another message with another code.
         """
-        if not self.messages.get("bot_challenge", None):
+        if not self.bot_message_id:
             raise AttributeError(
                 "There is not message to reload. Use 'Challenge.send_basics' first."
             )
 
-        old_message: discord.Message = self.messages["bot_challenge"]
-        try:
-            await old_message.delete()
-        except (discord.Forbidden, discord.HTTPException):
-            log.warning(
-                "Bot was unable to delete previous message in {guild}, ignoring.".format(
-                    guild=self.guild.name
-                )
-            )
+        self.discard_messages(self.bot_message_id)
 
         self.captcha.code = discapty.discapty.random_code()
-        embed_and_file = await self.captcha.generate_embed(
-            guild_name=self.guild.name,
+        start = time.perf_counter()
+        embed_and_file = await self.cog.renderer.generate_embed(
+            self.captcha,
+            self.config,
             title="{guild} Verification System".format(guild=self.guild.name),
             footer={"text": f"Tries: {self.trynum} / Limit: {self.limit}"},
             description=(
@@ -205,6 +286,7 @@ class Challenge:
                 "characters."
             ),
         )
+        self.metrics.render_time.observe(time.perf_counter() - start)
 
         try:
             bot_message: discord.Message = await self.channel.send(
@@ -214,7 +296,7 @@ class Challenge:
             )
         except discord.Forbidden:
             raise PermissionError("Cannot send message in verification channel.")
-        self.messages["bot_challenge"] = bot_message
+        self.bot_message_id = bot_message.id
         try:
             await bot_message.add_reaction("🔁")
         except discord.Forbidden:
@@ -226,51 +308,69 @@ class Challenge:
 
     def cancel_tasks(self) -> None:
         """Cancel the ongoing tasks."""
-        for task in self.tasks:
-            task: asyncio.Task
-            if not task.done():
-                task.cancel()
+        if self.tasks:
+            for task in self.tasks.values():
+                task: asyncio.Task
+                if not task.done():
+                    task.cancel()
+        self.tasks = None
+        self.scheduler.cancel(self.member.id)
+
+    def can_delete_messages(self) -> bool:
+        """Return if the bot can delete the member's messages in the verification channel."""
+        channel = self.channel
+        if isinstance(channel, discord.DMChannel):
+            # We're fine with not deleting user's message if it's in DM.
+            return True
+        return self.cog.permissions.get(channel).manage_messages
+
+    def discard_messages(self, *message_ids: int) -> None:
+        """Queue messages of the verification channel, they are deleted in bulk later."""
+        self.cog.cleaner.add(self.channel, *message_ids)
 
     async def cleanup_messages(self) -> bool:
         """
-        Remove every stocked messages.
+        Remove every stocked messages. Logs are not deleted.
 
+        Messages are given to the cog's cleaner, which delete them in bulk.
         Return a boolean, if the deletion was successful.
         """
-        errored = False
-        for message in self.messages.items():
-            message[0]: str
-            message[1]: discord.Message
-            if message[0] == "bot_challenge":
-                self.cancel_tasks()
-            if message[0] == "logs":
-                # We don't want to delete logs.
-                continue
-            try:
-                await message[1].delete()
-                del message
-            except discord.Forbidden:
-                if not isinstance(self.channel, discord.DMChannel):
-                    # We're fine with not deleting user's message if it's in DM.
-                    raise PermissionError("Cannot delete message.")
-            except discord.HTTPException:
-                errored = True
-        return True if not errored else False
-
-    def _give_me_tasks(self) -> list:
+        self.cancel_tasks()
+        if not self.can_delete_messages():
+            raise PermissionError("Cannot delete message.")
+        self.discard_messages(self.bot_message_id, self.answer_id)
+        self.bot_message_id = self.answer_id = None
+        return True
+
+    def _refresh_tasks(self) -> dict:
+        """Create the tasks that are missing, the ones still waiting are kept."""
+
         def leave_check(u):
             return u.id == self.member.id
 
-        return [
-            asyncio.create_task(
+        # Only the message's ID is kept, so the check is made here instead of using
+        # ReactionPredicate, which needs the message object.
+        message_id = self.bot_message_id
+
+        def reload_check(r, u):
+            return r.message.id == message_id and u.id == self.member.id and str(r.emoji) == "🔁"
+
+        if self.tasks is None:
+            self.tasks = {}
+        if "reaction" in self.tasks and self._reaction_message_id != self.bot_message_id:
+            # Captcha got reloaded, the old message cannot be reacted anymore.
+            self.tasks.pop("reaction").cancel()
+
+        if "reaction" not in self.tasks:
+            self.tasks["reaction"] = asyncio.create_task(
                 self.bot.wait_for(
                     "reaction_add",
-                    check=ReactionPredicate.with_emojis(
-                        "🔁", message=self.messages["bot_challenge"], user=self.member
-                    ),
+                    check=reload_check,
                 )
-            ),
-            asyncio.create_task(
+            )
+            self._reaction_message_id = self.bot_message_id
+        if "message" not in self.tasks:
+            self.tasks["message"] = asyncio.create_task(
                 self.bot.wait_for(
                     "message",
                     check=MessagePredicate.same_context(
@@ -278,9 +378,12 @@ class Challenge:
                         user=self.member,
                     ),
                 )
-            ),
-            asyncio.create_task(self.bot.wait_for("user_remove", check=leave_check)),
-        ]
+            )
+        if "leave" not in self.tasks:
+            self.tasks["leave"] = asyncio.create_task(
+                self.bot.wait_for("user_remove", check=leave_check)
+            )
+        return self.tasks
 
 
 # class ListenersAPI:
@@ -1,15 +1,18 @@
+import asyncio
 import logging
-from contextlib import suppress
+import time
 from datetime import datetime
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
 import discord
 from redbot.core import Config, commands
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils.chat_formatting import bold, error, humanize_list
 
 from .abc import CompositeMetaClass
 from .api import Challenge
+from .cleanup import MessageCleaner
 from .commands import OwnerCommands, Settings
 from .errors import (
     AlreadyHaveCaptchaError,
@@ -25,9 +28,19 @@ from .informations import (
     __patchnote_version__,
     __version__,
 )
-from .utils import build_kick_embed
-
-DEFAULT_GLOBAL = {"log_level": 50}
+from .images import DEFAULT_SIZE, CaptchaRenderer
+from .journal import AuditJournal
+from .metrics import CaptchaMetrics
+from .moderation import ModerationExecutor
+from .permissions import PermissionCache
+from .registry import LEASE_MARGIN, ChallengeRegistry, InMemoryRegistry, SQLiteRegistry
+from .scheduler import TimeoutScheduler
+
+DEFAULT_GLOBAL = {
+    "log_level": 50,
+    "registry": "memory",  # Where challenges are claimed, "memory" or "sqlite".
+    "registry_path": None,  # SQLite database shared by the bot processes.
+}
 DEFAULT_GUILD = {
     "channel": None,  # The channel where the captcha is sent.
     "logschannel": None,  # Where logs are sent.
@@ -37,9 +50,16 @@ DEFAULT_GUILD = {
     "type": "plain",  # Captcha type.
     "timeout": 5,  # Time in minutes before kicking.
     "retry": 3,  # The numnber of retry allowed.
+    "ban_threshold": None,  # Failed challenges per minute before banning instead of kicking.
+    "image_size": list(DEFAULT_SIZE),  # Width and height of the captcha image.
+    "image_format": "png",  # Format the captcha image is uploaded in.
+    "image_quality": None,  # Compression level/quality of the image, None for the default.
 }
 log = logging.getLogger("red.predeactor.captcha")
 
+# Seconds between two looks at the expired claims of a registry shared with other processes.
+REGISTRY_SWEEP_INTERVAL = 60
+
 
 class Captcha(
     Settings,
@@ -62,11 +82,33 @@ class Captcha(
         self.data.register_guild(**DEFAULT_GUILD)
 
         self.running = {}
+        self._guild_settings = {}
+        self.metrics = CaptchaMetrics()
+        self.scheduler = TimeoutScheduler(self._expire_challenges)
+        self.moderation = ModerationExecutor()
+        self.cleaner = MessageCleaner(bot)
+        self.renderer = CaptchaRenderer()
+        self.permissions = PermissionCache()
+        self.registry: ChallengeRegistry = InMemoryRegistry()
+        self._registry_sweeper: Optional[asyncio.Task] = None
+        self.journal = AuditJournal(cog_data_path(raw_name="Captcha") / "journal")
 
         self.version = __version__
         self.patchnote = __patchnote__
         self.patchnoteconfig = None
 
+    async def red_delete_data_for_user(
+        self,
+        *,
+        requester: Literal["discord_deleted_user", "owner", "user", "user_strict"],
+        user_id: int,
+    ):
+        """
+        Remove the member from the audit journal and the challenge registry.
+        """
+        await self.journal.forget(user_id)
+        await self.registry.forget(user_id)
+
     async def send_or_update_log_message(
         self,
         guild: discord.Guild,
@@ -147,21 +189,54 @@ class Captcha(
     async def create_challenge_for(self, member: discord.Member) -> Challenge:
         """
         Create a Challenge class for an user and append it to the running challenges.
+
+        The member is claimed in the registry first, so he is not challenged twice when
+        several processes share it.
         """
         if member.id in self.running:
             raise AlreadyHaveCaptchaError("The user already have a captcha object running.")
-        captcha = Challenge(self.bot, member, await self.data.guild(member.guild).all())
+        settings = await self._get_shared_settings(member.guild)
+        if not await self.registry.claim(
+            member.guild.id, member.id, settings["timeout"] * 60 + LEASE_MARGIN
+        ):
+            raise AlreadyHaveCaptchaError("The user is already challenged by another process.")
+        captcha = Challenge(self, member, settings)
         self.running[member.id] = captcha
         return captcha
 
+    async def _get_shared_settings(self, guild: discord.Guild) -> dict:
+        """
+        Return the settings of a guild, the same dict is given to every challenge of the guild
+        as long as the settings don't change.
+        """
+        settings = await self.data.guild(guild).all()
+        cached = self._guild_settings.get(guild.id)
+        if cached == settings:
+            return cached
+        self._guild_settings[guild.id] = settings
+        return settings
+
     async def delete_challenge_for(self, member: discord.Member) -> bool:
+        self.scheduler.cancel(member.id)
         try:
             del self.running[member.id]
-            return True
         except KeyError:
             return False
+        await self.registry.release(member.guild.id, member.id)
+        return True
+
+    async def is_challenged(self, member: discord.Member) -> bool:
+        """
+        Return if the member is doing a challenge, in this process or another one.
+        """
+        return member.id in self.running or await self.registry.is_claimed(
+            member.guild.id, member.id
+        )
 
     def is_running_challenge(self, member_or_id: Union[discord.Member, int]) -> bool:
+        """
+        Return if the member is doing a challenge owned by this process.
+        """
         if isinstance(member_or_id, discord.Member):
             member_or_id = int(member_or_id.id)
         return member_or_id in self.running
@@ -209,24 +284,30 @@ class Captcha(
                     timeout = True
                     break
                 except AskedForReload:
+                    challenge.metrics.incr("reloads")
+                    challenge.record("reload", trynum=challenge.trynum)
                     challenge.trynum += 1
                     continue
                 except LeftServerError:
+                    challenge.metrics.incr("left")
+                    challenge.record("left", trynum=challenge.trynum)
                     return False
                 except TypeError:
                     # In this error, the user reacted with an invalid (Most probably custom)
                     # emoji. While I expect administrator to remove this permissions, I still
                     # need to handle, so we're fine if we don't increase trynum.
                     continue
+                challenge.record("answer", trynum=challenge.trynum, correct=this)
                 if this is False:
                     challenge.trynum += 1
-                    try:
-                        await challenge.messages["answer"].delete()
-                    except discord.Forbidden:
+                    if challenge.can_delete_messages():
+                        challenge.discard_messages(challenge.answer_id)
+                        challenge.answer_id = None
+                    else:
                         await self.send_or_update_log_message(
                             challenge.guild,
                             error(bold("Unable to delete member's answer.")),
-                            challenge.messages.get("logs"),
+                            challenge.log_message,
                             member=challenge.member,
                         )
                     is_ok = False
@@ -234,23 +315,27 @@ class Captcha(
                     is_ok = True
 
             failed = challenge.trynum > limit
-            logmsg = challenge.messages["logs"]
+            logmsg = challenge.log_message
 
             if failed or timeout:
+                challenge.metrics.incr("failed" if failed else "timed_out")
                 reason = (
                     "Retried the captcha too many time."
                     if failed
                     else "Didn't answer to the challenge."
                 )
+                challenge.record("fail", trynum=challenge.trynum, reason=reason)
                 try:
-                    await self.nicely_kick_user_from_challenge(challenge, reason)
+                    action = await self.nicely_kick_user_from_challenge(challenge, reason)
+                    challenge.record("kick", action=action, reason=reason)
                     await self.send_or_update_log_message(
                         challenge.guild,
-                        bold(f"User kicked for reason: {reason}"),
+                        bold(f"User {action} for reason: {reason}"),
                         logmsg,
                         member=challenge.member,
                     )
                 except PermissionError:
+                    challenge.record("kick", action=None, reason="Missing permissions.")
                     await self.send_or_update_log_message(
                         challenge.guild,
                         error(bold("Permission missing for kicking member!")),
@@ -259,6 +344,10 @@ class Captcha(
                     )
                 return True
 
+            challenge.metrics.incr("passed")
+            solve_time = time.monotonic() - challenge.started_at
+            challenge.metrics.solve_time.observe(solve_time)
+            challenge.record("pass", trynum=challenge.trynum, solve_time=round(solve_time, 3))
             roles = [
                 challenge.guild.get_role(role)
                 for role in await self.data.guild(challenge.guild).autoroles()
@@ -305,7 +394,7 @@ class Captcha(
                 await self.send_or_update_log_message(
                     challenge.guild,
                     error(bold("Missing permissions for deleting all messages for verification!")),
-                    challenge.messages.get("logs"),
+                    challenge.log_message,
                     member=challenge.member,
                 )
         return True
@@ -322,12 +411,17 @@ class Captcha(
             if not isinstance(challenge.channel, discord.DMChannel)
             else challenge.guild.text_channels[0]
         )
-        if not channel.permissions_for(self.bot.get_guild(challenge.guild.id).me).manage_roles:
+        if not self.permissions.get(channel).manage_roles:
             raise PermissionError('Bot miss the "manage_roles" permission.')
 
         await challenge.member.add_roles(roles, reason="Passed Captcha successfully.")
 
-    async def nicely_kick_user_from_challenge(self, challenge: Challenge, reason: str):
+    async def nicely_kick_user_from_challenge(self, challenge: Challenge, reason: str) -> str:
+        """
+        Queue the kick of a member in the guild's moderation queue and wait for it.
+
+        Return "kicked", or "banned" if the guild is being raided. (See ``ban_threshold``)
+        """
         # We're gonna check our permission first, to avoid DMing the user for nothing.
 
         # Admin may have set channel to be DM, checking for kick_members is useless since
@@ -338,16 +432,94 @@ class Captcha(
             if not isinstance(challenge.channel, discord.DMChannel)
             else challenge.guild.text_channels[0]
         )
-        if not channel.permissions_for(self.bot.get_guild(challenge.guild.id).me).kick_members:
+        if not self.permissions.get(channel).kick_members:
             raise PermissionError('Bot miss the "kick_members" permission.')
 
-        with suppress(discord.Forbidden, discord.HTTPException):
-            await challenge.member.send(embed=build_kick_embed(challenge.guild, reason))
+        return await self.moderation.submit(
+            challenge.member, reason, ban_threshold=challenge.config.get("ban_threshold")
+        )
+
+    def _expire_challenges(self, member_ids: list) -> None:
+        """
+        Called by the scheduler with every challenge whose deadline expired.
+        """
+        for member_id in member_ids:
+            challenge = self.running.get(member_id)
+            if challenge:
+                challenge.expire()
+
+    def cog_unload(self):
+        if self._registry_sweeper is not None:
+            self._registry_sweeper.cancel()
+        self.scheduler.stop()
+        self.moderation.stop()
+        asyncio.create_task(self.cleaner.close())
+        asyncio.create_task(self._close_registry(self.registry))
+        asyncio.create_task(self.journal.close())
+
+    async def _load_registry(self) -> None:
+        """
+        Replace the registry if its backend changed in the settings.
+        """
+        backend = await self.data.registry()
+        if backend == "sqlite":
+            path = await self.data.registry_path() or str(
+                cog_data_path(raw_name="Captcha") / "challenges.sqlite3"
+            )
+            if isinstance(self.registry, SQLiteRegistry) and str(self.registry.path) == path:
+                return
+            registry = SQLiteRegistry(path)
+        else:
+            if isinstance(self.registry, InMemoryRegistry):
+                return
+            registry = InMemoryRegistry()
+        old, self.registry = self.registry, registry
+        await self._close_registry(old)
+        log.info("Captcha now uses the {name} challenge registry.".format(name=registry.name))
+        if isinstance(registry, SQLiteRegistry) and (
+            self._registry_sweeper is None or self._registry_sweeper.done()
+        ):
+            self._registry_sweeper = asyncio.create_task(self._sweep_registry())
+
+    async def _sweep_registry(self) -> None:
+        """
+        Take over the challenges of the processes that stopped without releasing them.
+
+        A claim past its deadline belongs to a dead process. Its member is challenged again by
+        the first process seeing the guild, or the claim is removed if the member left or
+        Captcha got disabled. Stops once the registry is not shared anymore.
+        """
+        await self.bot.wait_until_red_ready()
+        while isinstance(self.registry, SQLiteRegistry):
+            try:
+                for claim in await self.registry.expired():
+                    guild = self.bot.get_guild(claim.guild_id)
+                    if guild is None:
+                        continue  # Another bot sees this guild.
+                    member = guild.get_member(claim.member_id)
+                    if member is not None and await self.is_challenged(member):
+                        continue  # Taken over meanwhile.
+                    if member is None or not await self.basic_check(member):
+                        await self.registry.discard_expired(claim.guild_id, claim.member_id)
+                        continue
+                    log.info(
+                        "Taking over the challenge of {member} from {owner}.".format(
+                            member=member.id, owner=claim.owner
+                        )
+                    )
+                    # The claim is replaced when the new challenge is created.
+                    asyncio.create_task(self.runner(member))
+            except Exception as e:
+                log.error("Error while sweeping the challenge registry.", exc_info=e)
+            await asyncio.sleep(REGISTRY_SWEEP_INTERVAL)
+
+    @staticmethod
+    async def _close_registry(registry: ChallengeRegistry) -> None:
         try:
-            await challenge.guild.kick(challenge.member, reason=reason)
-        except discord.Forbidden:
-            raise PermissionError("Unable to kick member.")
-        return True
+            await registry.release_all()
+            await registry.close()
+        except Exception as e:
+            log.error("Error while closing the challenge registry.", exc_info=e)
 
     # PLEASE DON'T TOUCH THOSE FUNCTIONS WITH YOUR COG OR EVAL. Thanks. - Pred
     # Those should only be used by the cog - 4 bags of None of your business.
@@ -371,6 +543,7 @@ class Captcha(
         """
         log_level = await self.data.log_level()
         log.setLevel(log_level)
+        await self._load_registry()
         log.info("Captcha logging level has been set to: {lev}".format(lev=log_level))
         log.debug(
             "This logging level is reserved for testing and monitoring purpose, set the "
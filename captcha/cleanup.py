@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Dict, Optional, Set, Union
+
+import discord
+from redbot.core.bot import Red
+
+log = logging.getLogger("red.predeactor.captcha")
+
+# Seconds between two cleanups.
+CLEANUP_INTERVAL = 3
+# Maximum number of messages Discord accepts in a bulk delete.
+BULK_LIMIT = 100
+
+
+class MessageCleaner:
+    """Gather the messages to delete in each channel and delete them in bulk.
+
+    Finished challenges only give the IDs of their messages, they are deleted every
+    CLEANUP_INTERVAL seconds with a request per 100 messages instead of a request per message.
+    """
+
+    def __init__(self, bot: Red):
+        self.bot: Red = bot
+        self._pending: Dict[int, Set[int]] = {}
+        self._channels: Dict[int, Union[discord.TextChannel, discord.DMChannel]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._pending.values())
+
+    def add(self, channel: Union[discord.TextChannel, discord.DMChannel], *message_ids: int):
+        """Queue messages of a channel for deletion."""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids or channel is None:
+            return
+        self._channels[channel.id] = channel
+        self._pending.setdefault(channel.id, set()).update(message_ids)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._runner())
+
+    async def flush(self) -> None:
+        """Delete every queued message now."""
+        pending, self._pending = self._pending, {}
+        channels, self._channels = self._channels, {}
+        for channel_id, message_ids in pending.items():
+            channel = channels[channel_id]
+            if isinstance(channel, discord.DMChannel):
+                await self._delete_one_by_one(channel, message_ids)
+            else:
+                await self._delete_in_bulk(channel, message_ids)
+
+    async def close(self) -> None:
+        """Stop the cleaner, after deleting what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _delete_in_bulk(self, channel: discord.TextChannel, message_ids: Set[int]):
+        message_ids = sorted(message_ids)
+        for index in range(0, len(message_ids), BULK_LIMIT):
+            chunk = [
+                discord.Object(message_id)
+                for message_id in message_ids[index : index + BULK_LIMIT]
+            ]
+            try:
+                await channel.delete_messages(chunk)
+            except discord.Forbidden:
+                log.warning(
+                    "Bot was unable to delete messages in {guild}, ignoring.".format(
+                        guild=channel.guild.name
+                    )
+                )
+                return
+            except discord.HTTPException:
+                # One of the message may be already deleted, which fail the whole request.
+                await self._delete_one_by_one(channel, [message.id for message in chunk])
+
+    async def _delete_one_by_one(self, channel, message_ids) -> None:
+        for message_id in message_ids:
+            # We're fine with not deleting user's message if it's in DM.
+            with suppress(discord.HTTPException):
+                await self.bot.http.delete_message(channel.id, message_id)
+
+    async def _runner(self) -> None:
+        # Stops once there is nothing left to delete, restarted by the next add.
+        while self._pending:
+            await asyncio.sleep(CLEANUP_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("Error while cleaning verification channels.", exc_info=e)
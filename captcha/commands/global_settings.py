@@ -1,10 +1,16 @@
+import json
 from abc import ABCMeta
 from enum import Enum
+from io import BytesIO
+from typing import Optional
 
+import discord
 from redbot.core import commands
-from redbot.core.utils.chat_formatting import warning
+from redbot.core.utils.chat_formatting import box, pagify, warning
 
 from ..abc import MixinMeta
+from ..journal import format_entry
+from ..metrics import GuildMetrics, Histogram
 
 
 class OwnerCommands(MixinMeta, metaclass=ABCMeta):
@@ -49,6 +55,133 @@ class OwnerCommands(MixinMeta, metaclass=ABCMeta):
 
         await self._initialize(False)
 
+    @ownercmd.group(name="metrics", invoke_without_command=True)
+    async def metrics_group(self, ctx: commands.Context, guild_id: Optional[int] = None):
+        """
+        Show the metrics of Captcha since the cog was loaded.
+
+        ``guild_id``: Only show the metrics of this guild. All guilds are merged if omitted.
+        """
+        if guild_id is None:
+            metrics = self.metrics.total()
+            title = "All guilds"
+        else:
+            metrics = self.metrics.get(guild_id)
+            if metrics is None:
+                await ctx.send("There is no metric recorded for this guild.")
+                return
+            guild = self.bot.get_guild(guild_id)
+            title = guild.name if guild else str(guild_id)
+        await ctx.send(box(format_metrics(title, metrics), lang="yaml"))
+
+    @metrics_group.command(name="export")
+    async def metrics_export(self, ctx: commands.Context):
+        """
+        Export a snapshot of all metrics as a JSON file.
+        """
+        snapshot = json.dumps(self.metrics.snapshot(), indent=2).encode("utf-8")
+        await ctx.send(file=discord.File(BytesIO(snapshot), filename="captcha_metrics.json"))
+
+    @ownercmd.command(name="journal")
+    async def journal_viewer_all(
+        self, ctx: commands.Context, member_id: int = 0, guild_id: Optional[int] = None
+    ):
+        """
+        Show the last events of the audit journal.
+
+        ``member_id``: Only show the events of this member, 0 for every member.
+        ``guild_id``: Only show the events of this server.
+        """
+        async with ctx.typing():
+            entries = await self.journal.search(
+                guild_id=guild_id, member_id=member_id or None, limit=30
+            )
+        if not entries:
+            await ctx.send("No event recorded.")
+            return
+        for page in pagify("\n".join(map(format_entry, entries)), shorten_by=20):
+            await ctx.send(box(page))
+
+    @ownercmd.group(name="registry", invoke_without_command=True)
+    async def registry_group(self, ctx: commands.Context):
+        """
+        Show where challenges are claimed, and by which process.
+        """
+        counts = await self.registry.count()
+        expired = await self.registry.expired(limit=1000)
+        message = "Backend: {name}\nThis process: {owner}\nLocal challenges: {local}\n".format(
+            name=self.registry.name, owner=self.registry.owner, local=len(self.running)
+        )
+        if getattr(self.registry, "path", None):
+            message += "Database: {path}\n".format(path=self.registry.path)
+        message += "Claims:\n"
+        for owner, count in sorted(counts.items()):
+            message += "  {owner}: {count}\n".format(owner=owner, count=count)
+        if not counts:
+            message += "  None\n"
+        message += "Expired claims: {count}".format(count=len(expired))
+        await ctx.send(box(message, lang="yaml"))
+
+    @registry_group.command(name="backend", usage="<memory_or_sqlite> [path]")
+    async def registry_backend(
+        self, ctx: commands.Context, backend: str, *, path: Optional[str] = None
+    ):
+        """
+        Change where challenges are claimed.
+
+        - memory: Challenges are only known by this process, the default.
+        - sqlite: Challenges are claimed in a SQLite database, give the same ``path`` to every
+         bot process that must share them. Default to the cog's data folder.
+        """
+        backend = backend.lower()
+        if backend not in ("memory", "sqlite"):
+            await ctx.send_help()
+            return
+        if self.running:
+            await ctx.send(
+                warning(
+                    "Wait for the {count} running challenges to end before changing the "
+                    "registry.".format(count=len(self.running))
+                )
+            )
+            return
+        await self.data.registry.set(backend)
+        await self.data.registry_path.set(path if backend == "sqlite" else None)
+        await self._load_registry()
+        await ctx.send("Challenges are now claimed with the {name} registry.".format(name=backend))
+
+    @registry_group.command(name="purge")
+    async def registry_purge(self, ctx: commands.Context):
+        """
+        Remove the expired claims, left by processes that stopped without releasing them.
+        """
+        count = await self.registry.purge_expired()
+        await ctx.send("{count} expired claims removed.".format(count=count))
+
+
+def format_histogram(histogram: Histogram, unit: str = "s") -> str:
+    if not histogram.count:
+        return "No data"
+    return "count {count}, mean {mean:.3f}{unit}, p50 <= {p50}{unit}, p95 <= {p95}{unit}".format(
+        count=histogram.count,
+        mean=histogram.mean,
+        p50=histogram.quantile(0.5),
+        p95=histogram.quantile(0.95),
+        unit=unit,
+    )
+
+
+def format_metrics(title: str, metrics: GuildMetrics) -> str:
+    message = "{title}:\n".format(title=title)
+    for name, value in metrics.counters.items():
+        message += "  {name}: {value}\n".format(
+            name=name.replace("_", " ").capitalize(), value=value
+        )
+    message += "  Time to solve: {hist}\n".format(hist=format_histogram(metrics.solve_time))
+    message += "  Render time: {hist}\n".format(hist=format_histogram(metrics.render_time))
+    message += "  Loop time per challenge: {hist}".format(hist=format_histogram(metrics.loop_time))
+    return message
+
 
 class LoggingLevels(Enum):
     Lvl5 = "CRITICAL"
@@ -1,7 +1,7 @@
 # Builtin or Pip
 from abc import ABCMeta
 from random import choice
-from typing import Union
+from typing import Optional, Union
 
 # Discord/Red related
 import discord
@@ -12,6 +12,8 @@ from redbot.core.utils.predicates import ReactionPredicate
 
 # Local
 from ..abc import MixinMeta
+from ..images import DEFAULT_QUALITIES, FORMATS, MAX_SIZE, MIN_SIZE, QUALITY_RANGES
+from ..journal import format_entry
 from ..utils import (
     build_embed_with_missing_permissions,
     build_embed_with_missing_settings,
@@ -68,6 +70,7 @@ class Settings(MixinMeta, metaclass=ABCMeta):
                     "attach_files",
                 ],
                 destination,
+                cache=self.permissions,
             ):
                 await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
                 return
@@ -118,6 +121,7 @@ class Settings(MixinMeta, metaclass=ABCMeta):
                 "attach_files",
             ],
             destination,
+            cache=self.permissions,
         ):
             await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
             return
@@ -166,6 +170,7 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         if needperm := await check_permissions_in_channel(
             perms,
             self.bot.get_channel(config["channel"]) if not is_dm else ctx.channel,
+            cache=self.permissions,
         ):
             await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
             return
@@ -247,7 +252,9 @@ class Settings(MixinMeta, metaclass=ABCMeta):
                 # EEEHHHH C'EST LE DAB DU J'M'EN BAT ROYAL LES COUILLES
             return
 
-        if needperm := await check_permissions_in_channel(["manage_roles"], ctx.channel):
+        if needperm := await check_permissions_in_channel(
+            ["manage_roles"], ctx.channel, cache=self.permissions
+        ):
             await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
             return
 
@@ -283,6 +290,96 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         await self.data.guild(ctx.guild).retry.set(number_of_retries)
         await ctx.send(f"Alright, it's been set to {str(number_of_retries)}")
 
+    @config.command(name="banthreshold", aliases=["raidban"], usage="<failures_per_minute_or_0>")
+    async def ban_threshold_setter(self, ctx: commands.Context, failures_per_minute: int):
+        """
+        Ban members instead of kicking them when the server is being raided.
+
+        Once this many challenges failed in the last minute, members failing the captcha are
+        banned instead of kicked. Use `0` to always kick.
+        """
+        if failures_per_minute < 1:
+            await self.data.guild(ctx.guild).ban_threshold.clear()
+            await ctx.send(form.info("Members failing the captcha will always be kicked."))
+            return
+
+        if needperm := await check_permissions_in_channel(
+            ["ban_members"], ctx.channel, cache=self.permissions
+        ):
+            await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
+            return
+
+        await self.data.guild(ctx.guild).ban_threshold.set(failures_per_minute)
+        await ctx.send(
+            form.info(
+                "Members will be banned once {num} challenge{plur} failed in a minute.".format(
+                    num=failures_per_minute, plur="s" if failures_per_minute > 1 else ""
+                )
+            )
+        )
+
+    @config.command(name="imageformat", usage="<png/webp/jpeg> [quality]")
+    async def image_format_setter(
+        self, ctx: commands.Context, image_format: str, quality: Optional[int] = None
+    ):
+        """
+        Change the format captcha images are sent in.
+
+        The quality depends of the format:
+        - png: The compression level, from 0 to 9. Higher is smaller but slower. Default to 6.
+        - webp and jpeg: The quality, from 1 to 100. Lower is smaller. Default to 80.
+
+        WebP and JPEG images are a lot lighter than PNG ones. Does not apply to plain captcha.
+        """
+        image_format = image_format.lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in FORMATS:
+            await ctx.send_help()
+            return
+        if quality is not None:
+            minimum, maximum = QUALITY_RANGES[image_format]
+            if not minimum <= quality <= maximum:
+                await ctx.send(
+                    form.error(
+                        "The quality of {format} must be between {min} and {max}.".format(
+                            format=image_format, min=minimum, max=maximum
+                        )
+                    )
+                )
+                return
+
+        await self.data.guild(ctx.guild).image_format.set(image_format)
+        await self.data.guild(ctx.guild).image_quality.set(quality)
+        await ctx.send(
+            form.info(
+                "Captcha images will be sent as {format}, with a quality of {quality}.".format(
+                    format=image_format.upper(),
+                    quality=DEFAULT_QUALITIES[image_format] if quality is None else quality,
+                )
+            )
+        )
+
+    @config.command(name="imagesize", usage="<width> <height>")
+    async def image_size_setter(self, ctx: commands.Context, width: int, height: int):
+        """
+        Change the size of captcha images, in pixels.
+
+        Smaller images are lighter to send. Default to 350x100.
+        """
+        if not (MIN_SIZE[0] <= width <= MAX_SIZE[0] and MIN_SIZE[1] <= height <= MAX_SIZE[1]):
+            await ctx.send(
+                form.error(
+                    "The size must be between {min[0]}x{min[1]} and {max[0]}x{max[1]}.".format(
+                        min=MIN_SIZE, max=MAX_SIZE
+                    )
+                )
+            )
+            return
+
+        await self.data.guild(ctx.guild).image_size.set([width, height])
+        await ctx.send(form.info("Captcha images will be {w}x{h}.".format(w=width, h=height)))
+
     # Taken from my logic at
     # https://github.com/SharkyTheKing/Sharky/blob/master/verify/verification.py#L163, thank buddy
     # What the f*ck do you mean I'm lazy? Dude I made 3/4 of the cog and logic in less a week, I
@@ -293,7 +390,9 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         """
         Set the roles to give when passing the captcha.
         """
-        if needperm := await check_permissions_in_channel(["manage_roles"], ctx.channel):
+        if needperm := await check_permissions_in_channel(
+            ["manage_roles"], ctx.channel, cache=self.permissions
+        ):
             await ctx.send(embed=await build_embed_with_missing_permissions(needperm))
             return False
         await ctx.send_help()
@@ -308,7 +407,9 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         if not roles:
             await ctx.send_help()
             return
-        if await check_permissions_in_channel(["manage_roles"], ctx.channel):
+        if await check_permissions_in_channel(
+            ["manage_roles"], ctx.channel, cache=self.permissions
+        ):
             return
 
         message = ""
@@ -356,7 +457,9 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         if not roles:
             await ctx.send_help()
             return
-        if await check_permissions_in_channel(["manage_roles"], ctx.channel):
+        if await check_permissions_in_channel(
+            ["manage_roles"], ctx.channel, cache=self.permissions
+        ):
             return
 
         message = ""
@@ -419,6 +522,23 @@ class Settings(MixinMeta, metaclass=ABCMeta):
         else:
             await ctx.send("No role has been added.")
 
+    @config.command(name="journal", usage="[member]")
+    async def journal_viewer(self, ctx: commands.Context, *, member: discord.User = None):
+        """
+        Show the last events of the audit journal in this server.
+
+        ``member``: Only show the events of this member. The member may have left the server.
+        """
+        async with ctx.typing():
+            entries = await self.journal.search(
+                guild_id=ctx.guild.id, member_id=member.id if member else None, limit=30
+            )
+        if not entries:
+            await ctx.send(form.info("No event recorded."))
+            return
+        for page in form.pagify("\n".join(map(format_entry, entries)), shorten_by=20):
+            await ctx.send(form.box(page))
+
     @config.command(name="forgetme")
     async def forget_guild_settings(self, ctx: commands.Context):
         """Delete guild's data."""
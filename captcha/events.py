@@ -5,11 +5,14 @@ import logging
 from abc import ABCMeta
 from traceback import format_exception
 
-from discord import Member
+from discord import Guild, Member, Role
+from discord.abc import GuildChannel
 from redbot.core import commands
 from redbot.core.utils.chat_formatting import bold
 
 from .abc import MixinMeta
+from .errors import AlreadyHaveCaptchaError
+from .metrics import LoopTimer
 
 log = logging.getLogger("red.predeactor.captcha")
 
@@ -18,10 +21,17 @@ class Listeners(MixinMeta, metaclass=ABCMeta):
     async def runner(self, member: Member):
         allowed = await self.basic_check(member)
         if allowed:
-            challenge = await self.create_challenge_for(member)
+            try:
+                challenge = await self.create_challenge_for(member)
+            except AlreadyHaveCaptchaError:
+                log.debug("{member} is already challenged, ignoring.".format(member=member.id))
+                return
+            challenge.metrics.incr("started")
+            challenge.record("started", type=challenge.type)
+            timer = LoopTimer(self.realize_challenge(challenge))
             # noinspection PyBroadException
             try:
-                await self.realize_challenge(challenge)
+                await timer
             except Exception as e:
                 log.critical(
                     f"An unexpected error happened!\n"
@@ -29,6 +39,7 @@ class Listeners(MixinMeta, metaclass=ABCMeta):
                     f"Error: {format_exception(type(e), e, e.__traceback__)}"
                 )
             finally:
+                challenge.metrics.loop_time.observe(timer.elapsed)
                 await self.delete_challenge_for(member)
 
     async def cleaner(self, member: Member):
@@ -41,7 +52,7 @@ class Listeners(MixinMeta, metaclass=ABCMeta):
             await self.send_or_update_log_message(
                 challenge.guild,
                 bold("User has left the server."),
-                challenge.messages["logs"],
+                challenge.log_message,
                 member=challenge.member,
             )
         except Exception as e:
@@ -61,6 +72,35 @@ class Listeners(MixinMeta, metaclass=ABCMeta):
     async def on_member_remove(self, member: Member):
         await self.cleaner(member)
 
+    # Keep the permission cache up to date.
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: GuildChannel, after: GuildChannel):
+        self.permissions.invalidate(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: GuildChannel):
+        self.permissions.invalidate(channel.guild.id, channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: Role, after: Role):
+        # Overwrites of other roles do not apply to the bot, only its own roles matter.
+        if after.is_default() or after in after.guild.me.roles:
+            self.permissions.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: Role):
+        self.permissions.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: Member, after: Member):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self.permissions.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: Guild):
+        self.permissions.invalidate(guild.id)
+
     # @commands.command(name="testing")
     # @commands.is_owner()
     # async def challenge(self, ctx: commands.Context, member: discord.Member):
@@ -0,0 +1,150 @@
+import asyncio
+from io import BytesIO
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import discapty
+import discord
+from discapty.generator import DEFAULT_FONTS, ImageCaptcha
+from PIL import Image
+from wheezy.captcha import image as wheezy_captcha
+
+# Format name: (Pillow format, file extension)
+FORMATS = {"png": ("PNG", "png"), "webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+# PNG uses a zlib compression level, WebP and JPEG use a quality.
+QUALITY_RANGES = {"png": (0, 9), "webp": (1, 100), "jpeg": (1, 100)}
+DEFAULT_QUALITIES = {"png": 6, "webp": 80, "jpeg": 80}
+DEFAULT_SIZE = (350, 100)
+# Keep the images readable and under Discord's embed limits.
+MIN_SIZE = (150, 50)
+MAX_SIZE = (1000, 300)
+
+
+class WheezyGenerator:
+    """Same drawing as discapty's WheezyCaptcha, but the pipeline, and so the fonts, is only
+    built once. discapty builds it again for every captcha.
+    """
+
+    def __init__(self, width: int, height: int, fonts=None):
+        self._render: Callable[[str], Image.Image] = wheezy_captcha.captcha(
+            drawings=[
+                wheezy_captcha.background(),
+                wheezy_captcha.text(
+                    fonts=fonts or DEFAULT_FONTS,
+                    drawings=[
+                        wheezy_captcha.warp(),
+                        wheezy_captcha.rotate(),
+                        wheezy_captcha.offset(),
+                    ],
+                ),
+                wheezy_captcha.curve(),
+                wheezy_captcha.noise(),
+                wheezy_captcha.smooth(),
+            ],
+            width=width,
+            height=height,
+        )
+
+    async def generate(self, chars: str) -> Image.Image:
+        return self._render(chars)
+
+
+def encode_image(image: Image.Image, image_format: str, quality: Optional[int] = None) -> BytesIO:
+    """Encode a captcha image in the given format.
+
+    Parameters:
+        image: The image to encode.
+        image_format: One of FORMATS.
+        quality: The compression level for PNG, the quality for WebP and JPEG. The default
+         of the format is used if omitted.
+    """
+    if quality is None:
+        quality = DEFAULT_QUALITIES[image_format]
+    pillow_format = FORMATS[image_format][0]
+    if image_format == "png":
+        options = {"compress_level": quality}
+    elif image_format == "webp":
+        options = {"quality": quality, "method": 4}
+    else:
+        options = {"quality": quality, "optimize": True}
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    out = BytesIO()
+    image.save(out, format=pillow_format, **options)
+    out.seek(0)
+    return out
+
+
+class CaptchaRenderer:
+    """Render the image of the challenges with the settings of their guild.
+
+    Generators are created once for each type and size, so fonts are loaded from the disk
+    a single time instead of at every challenge.
+    """
+
+    def __init__(self):
+        self._generators: Dict[Tuple[str, int, int], object] = {}
+        for captcha_type in ("image", "wheezy"):
+            self.generator(captcha_type, DEFAULT_SIZE)
+
+    def generator(self, captcha_type: str, size: Tuple[int, int]):
+        key = (captcha_type, *size)
+        try:
+            return self._generators[key]
+        except KeyError:
+            pass
+        if captcha_type == "wheezy":
+            generator = WheezyGenerator(*size)
+        else:
+            generator = ImageCaptcha(*size)
+            generator.truefonts  # Load the fonts now.
+        self._generators[key] = generator
+        return generator
+
+    async def render(self, captcha_type: str, code: str, settings: Mapping) -> discord.File:
+        """Render and encode the image of a code."""
+        generator = self.generator(captcha_type, tuple(settings["image_size"]))
+        image = await generator.generate(code)
+        image_format = settings["image_format"]
+        # Encoding does not need the loop, high PNG compression levels take a while.
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, encode_image, image, image_format, settings["image_quality"]
+        )
+        return discord.File(data, filename="captcha." + FORMATS[image_format][1])
+
+    async def generate_embed(
+        self,
+        captcha: discapty.Captcha,
+        settings: Mapping,
+        *,
+        title: str,
+        description: str,
+        footer: Optional[Mapping[str, str]] = None,
+        author: Optional[Mapping[str, str]] = None,
+    ) -> dict:
+        """Generate the embed of a challenge, like ``discapty.Captcha.generate_embed``.
+
+        Plain captchas are left to discapty since they have no image.
+        """
+        captcha_type = settings["type"]
+        if captcha_type == "plain":
+            return await captcha.generate_embed(
+                guild_name="",
+                title=title,
+                description=description,
+                footer=footer,
+                author=author,
+            )
+
+        file = await self.render(captcha_type, captcha.code, settings)
+        embed = discord.Embed(
+            title=title, description=description, colour=discord.Colour.default()
+        )
+        if footer:
+            embed.set_footer(text=footer.get("text", discord.Embed.Empty))
+        if author:
+            embed.set_author(
+                name=author.get("name", discord.Embed.Empty),
+                icon_url=author.get("url", discord.Embed.Empty),
+            )
+        embed.set_image(url="attachment://" + file.filename)
+        return {"embed": embed, "image": file}
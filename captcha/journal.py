@@ -0,0 +1,209 @@
+import asyncio
+import gzip
+import json
+import logging
+import shutil
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+log = logging.getLogger("red.predeactor.captcha")
+
+EVENTS = ("started", "reload", "answer", "pass", "fail", "kick", "left")
+
+# Seconds between two writes of the buffer.
+FLUSH_INTERVAL = 5
+# The buffer is written sooner once it holds this many events.
+FLUSH_SIZE = 500
+# The journal is rotated once it reaches this size, in bytes.
+MAX_SIZE = 8 * 1024 * 1024
+# Number of compressed journals kept.
+BACKUP_COUNT = 10
+
+
+def format_entry(entry: dict) -> str:
+    """Return an event of the journal on a single line."""
+    details = ", ".join(
+        "{key}={value}".format(key=key, value=value)
+        for key, value in entry.items()
+        if key not in ("time", "event", "guild", "member")
+    )
+    return "{time} {event:<7} guild={guild} member={member}{details}".format(
+        time=entry.get("time", "?")[:19].replace("T", " "),
+        event=entry.get("event", "?"),
+        guild=entry.get("guild"),
+        member=entry.get("member"),
+        details=" " + details if details else "",
+    )
+
+
+class AuditJournal:
+    """Append-only JSON Lines journal of the challenges.
+
+    Recording an event only appends it to a buffer, a background task writes the buffer in a
+    thread. The journal is rotated and compressed with gzip once it gets too big, the oldest
+    archives are removed.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        max_size: int = MAX_SIZE,
+        backup_count: int = BACKUP_COUNT,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.directory: Path = directory
+        self.path: Path = directory / "captcha.jsonl"
+        self.max_size: int = max_size
+        self.backup_count: int = backup_count
+        self.flush_interval: float = flush_interval
+
+        self._buffer: List[str] = []
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def record(self, event: str, guild_id: int, member_id: int, **details) -> None:
+        """Add an event to the journal. Nothing is written to the disk here."""
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "event": event,
+            "guild": guild_id,
+            "member": member_id,
+        }
+        if details:
+            entry.update(details)
+        self._buffer.append(json.dumps(entry, separators=(",", ":")))
+        if self._task is None or self._task.done():
+            self._flush_now = asyncio.Event()
+            self._task = asyncio.create_task(self._writer())
+        elif len(self._buffer) >= FLUSH_SIZE:
+            self._flush_now.set()
+
+    async def flush(self) -> None:
+        """Write the buffered events."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            await asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def search(
+        self, *, guild_id: Optional[int] = None, member_id: Optional[int] = None, limit: int = 20
+    ) -> List[dict]:
+        """Return the last events of a guild and/or a member, the oldest first.
+
+        Journals are streamed line by line in a thread, only the matching events are kept.
+        """
+        await self.flush()
+
+        def _search():
+            found = deque(maxlen=limit)
+            for entry in self._read():
+                if guild_id is not None and entry.get("guild") != guild_id:
+                    continue
+                if member_id is not None and entry.get("member") != member_id:
+                    continue
+                found.append(entry)
+            return list(found)
+
+        return await asyncio.get_running_loop().run_in_executor(None, _search)
+
+    async def forget(self, member_id: int) -> int:
+        """Remove every event of a member from the journals. Return how many were removed.
+
+        Each journal is rewritten without the member's events, in a thread.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            kept = [line for line in self._buffer if json.loads(line)["member"] != member_id]
+            removed, self._buffer = len(self._buffer) - len(kept), kept
+            return removed + await asyncio.get_running_loop().run_in_executor(
+                None, self._forget, member_id
+            )
+
+    def archives(self) -> List[Path]:
+        """Return the compressed journals, the oldest first."""
+        return sorted(self.directory.glob("captcha-*.jsonl.gz"))
+
+    def _write(self, lines: List[str]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+            size = file.tell()
+        if size >= self.max_size:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        archive = self.directory / "captcha-{stamp}.jsonl.gz".format(stamp=stamp)
+        rotated = self.path.with_suffix(".jsonl.rotating")
+        self.path.replace(rotated)
+        with rotated.open("rb") as source, gzip.open(archive, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+        rotated.unlink()
+        for old in self.archives()[: -self.backup_count or None]:
+            old.unlink()
+
+    def _forget(self, member_id: int) -> int:
+        removed = 0
+        for path in [*self.archives(), self.path]:
+            if not path.exists():
+                continue
+            opener = gzip.open if path.suffix == ".gz" else open
+            with opener(path, "rt", encoding="utf-8") as file:
+                lines = file.readlines()
+            kept = []
+            for line in lines:
+                try:
+                    if json.loads(line).get("member") == member_id:
+                        continue
+                except json.JSONDecodeError:
+                    pass
+                kept.append(line)
+            if len(kept) == len(lines):
+                continue
+            removed += len(lines) - len(kept)
+            # Replaced at once, a search never reads a partly rewritten journal.
+            temporary = path.with_name(path.name + ".tmp")
+            with opener(temporary, "wt", encoding="utf-8") as file:
+                file.writelines(kept)
+            temporary.replace(path)
+        return removed
+
+    def _read(self) -> Iterator[dict]:
+        files = [*self.archives(), self.path]
+        for path in files:
+            if not path.exists():
+                continue
+            opener = gzip.open if path.suffix == ".gz" else open
+            with opener(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partly written line.
+
+    async def _writer(self) -> None:
+        # Stops once the buffer is empty, restarted by the next record.
+        while self._buffer:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("Error while writing the Captcha journal.", exc_info=e)
@@ -0,0 +1,169 @@
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+COUNTERS = ("started", "passed", "failed", "timed_out", "left", "reloads")
+
+# Upper bounds of each bucket, in seconds. Anything above the last bound goes in the overflow
+# bucket, so memory used by an histogram never grows.
+SOLVE_TIME_BUCKETS = (5, 10, 15, 30, 45, 60, 120, 180, 300, 600, 900)
+RENDER_TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LOOP_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+
+class Histogram:
+    """A fixed-bucket histogram."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds: tuple = tuple(bounds)
+        self.counts: list = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram") -> None:
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets.")
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        """Return the upper bound of the bucket containing the given quantile.
+
+        Return None if nothing has been observed, and infinity if the quantile is in the
+        overflow bucket.
+        """
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "buckets": [*self.bounds, "+Inf"],
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": round(self.sum, 6),
+        }
+
+
+class GuildMetrics:
+    """Counters and histograms of a guild."""
+
+    __slots__ = ("counters", "solve_time", "render_time", "loop_time")
+
+    def __init__(self):
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.solve_time: Histogram = Histogram(SOLVE_TIME_BUCKETS)
+        self.render_time: Histogram = Histogram(RENDER_TIME_BUCKETS)
+        self.loop_time: Histogram = Histogram(LOOP_TIME_BUCKETS)
+
+    def incr(self, counter: str, value: int = 1) -> None:
+        if counter not in self.counters:
+            raise KeyError("Unknown counter: {name}".format(name=counter))
+        self.counters[counter] += value
+
+    def merge(self, other: "GuildMetrics") -> None:
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        self.solve_time.merge(other.solve_time)
+        self.render_time.merge(other.render_time)
+        self.loop_time.merge(other.loop_time)
+
+    def to_dict(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "solve_time": self.solve_time.to_dict(),
+            "render_time": self.render_time.to_dict(),
+            "loop_time": self.loop_time.to_dict(),
+        }
+
+
+class CaptchaMetrics:
+    """Hold the metrics of every guild since the cog was loaded."""
+
+    def __init__(self):
+        self.since: datetime = datetime.utcnow()
+        self._guilds: Dict[int, GuildMetrics] = {}
+
+    def guild(self, guild_id: int) -> GuildMetrics:
+        """Return the metrics of a guild, creating them if needed."""
+        try:
+            return self._guilds[guild_id]
+        except KeyError:
+            metrics = self._guilds[guild_id] = GuildMetrics()
+            return metrics
+
+    def get(self, guild_id: int) -> Optional[GuildMetrics]:
+        return self._guilds.get(guild_id)
+
+    def total(self) -> GuildMetrics:
+        """Return the metrics of all guilds merged together."""
+        total = GuildMetrics()
+        for metrics in self._guilds.values():
+            total.merge(metrics)
+        return total
+
+    def snapshot(self) -> dict:
+        """Return a JSON serializable copy of all metrics."""
+        return {
+            "since": self.since.isoformat(),
+            "generated_at": datetime.utcnow().isoformat(),
+            "total": self.total().to_dict(),
+            "guilds": {
+                str(guild_id): metrics.to_dict() for guild_id, metrics in self._guilds.items()
+            },
+        }
+
+
+class LoopTimer:
+    """Wrap a coroutine and measure the time it spends running on the event loop.
+
+    Time spent waiting (For a message, a HTTP request...) is not counted, only the time each
+    step of the coroutine blocks the loop.
+    """
+
+    __slots__ = ("_coro", "elapsed")
+
+    def __init__(self, coro):
+        self._coro = coro
+        self.elapsed: float = 0.0
+
+    def __await__(self):
+        step = self._coro.__await__()
+        send, value = step.send, None
+        while True:
+            start = time.perf_counter()
+            try:
+                yielded = send(value)
+            except StopIteration as result:
+                self.elapsed += time.perf_counter() - start
+                return result.value
+            except BaseException:
+                self.elapsed += time.perf_counter() - start
+                raise
+            self.elapsed += time.perf_counter() - start
+            try:
+                value = yield yielded
+            except BaseException as exception:
+                send, value = step.throw, exception
+            else:
+                send = step.send
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
+from typing import Dict, Optional
+
+import discord
+
+from .utils import build_kick_embed
+
+log = logging.getLogger("red.predeactor.captcha")
+
+# Seconds between two kicks/bans in the same guild.
+ACTION_INTERVAL = 0.5
+# Number of actions taken from the queue at once.
+BATCH_SIZE = 10
+# Members are not DMed anymore once this many actions are waiting in the guild's queue.
+DM_SKIP_THRESHOLD = 5
+# Period, in seconds, used to compute the failure rate of a guild.
+FAILURE_WINDOW = 60
+
+
+class ModerationAction:
+    __slots__ = ("member", "reason", "ban_threshold", "future")
+
+    def __init__(
+        self,
+        member: discord.Member,
+        reason: str,
+        ban_threshold: Optional[int],
+        future: asyncio.Future,
+    ):
+        self.member: discord.Member = member
+        self.reason: str = reason
+        self.ban_threshold: Optional[int] = ban_threshold
+        self.future: asyncio.Future = future
+
+
+class GuildModerationQueue:
+    """Queue of the members to kick (Or ban) in a guild.
+
+    A single worker consume the queue and wait between each action, so a raid does not send
+    thousands of requests to the kick and DM endpoints at the same time.
+    """
+
+    def __init__(self, guild: discord.Guild):
+        self.guild: discord.Guild = guild
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Actions taken from the queue by the worker, the first one is being executed.
+        self._batch: deque = deque()
+        self.failures: deque = deque()  # Loop time of every failed challenge.
+        self._next_action: float = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Return the number of actions not done yet, including the one being executed."""
+        return len(self._batch) + self.queue.qsize()
+
+    def failure_rate(self) -> int:
+        """Return the number of failed challenges during the last FAILURE_WINDOW seconds."""
+        limit = asyncio.get_running_loop().time() - FAILURE_WINDOW
+        while self.failures and self.failures[0] < limit:
+            self.failures.popleft()
+        return len(self.failures)
+
+    def put(self, action: ModerationAction) -> None:
+        self.failures.append(asyncio.get_running_loop().time())
+        self.queue.put_nowait(action)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        for action in self._batch:
+            action.future.cancel()
+        self._batch.clear()
+        while not self.queue.empty():
+            self.queue.get_nowait().future.cancel()
+
+    async def _worker(self) -> None:
+        # The worker stops once the queue is empty, it is restarted by the next put.
+        while not self.queue.empty():
+            while len(self._batch) < BATCH_SIZE and not self.queue.empty():
+                self._batch.append(self.queue.get_nowait())
+            while self._batch:
+                # Kept in the batch while executed, so stop() can cancel it.
+                action = self._batch[0]
+                if not action.future.done():  # The challenge may be cancelled meanwhile.
+                    try:
+                        result = await self._execute(action)
+                    except Exception as e:
+                        if not action.future.done():
+                            action.future.set_exception(e)
+                    else:
+                        if not action.future.done():
+                            action.future.set_result(result)
+                self._batch.popleft()
+
+    async def _execute(self, action: ModerationAction) -> str:
+        loop = asyncio.get_running_loop()
+        delay = self._next_action - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        ban = (
+            bool(action.ban_threshold)
+            and self.failure_rate() >= action.ban_threshold
+            and self.guild.me.guild_permissions.ban_members
+        )
+        # The action being executed is not counted.
+        if self.pending - 1 < DM_SKIP_THRESHOLD:
+            with suppress(discord.Forbidden, discord.HTTPException):
+                await action.member.send(
+                    embed=build_kick_embed(self.guild, action.reason, banned=ban)
+                )
+        try:
+            if ban:
+                await self.guild.ban(action.member, reason=action.reason, delete_message_days=0)
+            else:
+                await self.guild.kick(action.member, reason=action.reason)
+        except discord.Forbidden:
+            raise PermissionError(
+                "Unable to {action} member.".format(action="ban" if ban else "kick")
+            )
+        finally:
+            self._next_action = loop.time() + ACTION_INTERVAL
+        return "banned" if ban else "kicked"
+
+
+class ModerationExecutor:
+    """Hold the moderation queue of every guild."""
+
+    def __init__(self):
+        self._queues: Dict[int, GuildModerationQueue] = {}
+
+    def pending(self, guild_id: int) -> int:
+        """Return the number of actions waiting in a guild."""
+        queue = self._queues.get(guild_id)
+        return queue.pending if queue else 0
+
+    async def submit(
+        self, member: discord.Member, reason: str, *, ban_threshold: Optional[int] = None
+    ) -> str:
+        """Queue the kick of a member who failed a challenge and wait for it.
+
+        If ``ban_threshold`` is given and at least this many challenges failed in the guild
+        during the last minute, the member is banned instead.
+
+        Returns:
+            str: "kicked" or "banned".
+
+        Raises:
+            PermissionError: The bot is not allowed to kick/ban the member.
+        """
+        try:
+            queue = self._queues[member.guild.id]
+        except KeyError:
+            queue = self._queues[member.guild.id] = GuildModerationQueue(member.guild)
+        future = asyncio.get_running_loop().create_future()
+        queue.put(ModerationAction(member, reason, ban_threshold, future))
+        return await future
+
+    def stop(self) -> None:
+        for queue in self._queues.values():
+            queue.stop()
+        self._queues.clear()
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import discord
+
+
+class PermissionCache:
+    """Keep the permissions of the bot in each channel.
+
+    Resolving permissions goes through every role and overwrite of the guild, during a raid
+    it would be done again for each member. The cache is invalidated by the cog's listeners
+    when a channel, a role or the bot's member is updated.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[int, int], discord.Permissions] = {}
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(
+        self, channel: Union[discord.abc.GuildChannel, discord.DMChannel]
+    ) -> discord.Permissions:
+        """Return the permissions of the bot in a channel."""
+        if isinstance(channel, discord.DMChannel):
+            # Not worth caching, and there is no guild.
+            return channel.permissions_for(channel.me)
+        key = (channel.guild.id, channel.id)
+        try:
+            return self._cache[key]
+        except KeyError:
+            permissions = self._cache[key] = channel.permissions_for(channel.guild.me)
+            return permissions
+
+    def missing(
+        self, permissions: List[str], channel: Union[discord.abc.GuildChannel, discord.DMChannel]
+    ) -> List[str]:
+        """Return the permissions the bot does not have in the channel."""
+        channel_permissions = self.get(channel)
+        return [
+            permission
+            for permission in permissions
+            if not getattr(channel_permissions, permission)
+        ]
+
+    def invalidate(self, guild_id: int, channel_id: Optional[int] = None) -> None:
+        """Forget the permissions of a channel, or of every channel of a guild."""
+        if channel_id is not None:
+            self._cache.pop((guild_id, channel_id), None)
+            return
+        for key in [key for key in self._cache if key[0] == guild_id]:
+            del self._cache[key]
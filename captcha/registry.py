@@ -0,0 +1,338 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+# Seconds a claim outlives the deadline of its challenge. Past this, the process owning it is
+# considered dead and another process can take the member over.
+LEASE_MARGIN = 60
+
+
+def default_owner() -> str:
+    """Identify the current process among the other bot processes."""
+    return "{host}:{pid}".format(host=socket.gethostname(), pid=os.getpid())
+
+
+class Claim(NamedTuple):
+    guild_id: int
+    member_id: int
+    owner: str
+    deadline: float  # UNIX timestamp, shared between processes unlike loop time.
+
+
+class ChallengeRegistry(ABC):
+    """Record which process owns the challenge of a member.
+
+    Challenge objects stay in the process that created them, the registry only makes sure a
+    member is challenged once across every process. A claim expires at its deadline, so the
+    claims of a crashed process are taken over instead of blocking members forever.
+    """
+
+    name: str
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner: str = owner or default_owner()
+
+    @abstractmethod
+    async def claim(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        """Atomically claim a member for ``ttl`` seconds.
+
+        Return False if another live claim exists, whoever owns it.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def extend(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        """Move the deadline of our claim to ``ttl`` seconds from now.
+
+        Return False if the claim is not ours anymore.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def release(self, guild_id: int, member_id: int) -> bool:
+        """Remove our claim on a member. Return False if we did not own it."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def release_all(self) -> int:
+        """Remove every claim of this process. Return the number of removed claims."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def forget(self, member_id: int) -> int:
+        """Remove the claims on a member in every guild, whoever owns them. Return the number
+        of removed claims."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get(self, guild_id: int, member_id: int) -> Optional[Claim]:
+        """Return the live claim on a member, if any."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def expired(self, now: Optional[float] = None, limit: int = 100) -> List[Claim]:
+        """Return the claims whose deadline passed, the oldest first."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def discard_expired(self, guild_id: int, member_id: int) -> bool:
+        """Remove the claim on a member if its deadline passed, whoever owns it. Return False
+        if there was no expired claim."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def purge_expired(self, now: Optional[float] = None) -> int:
+        """Remove the claims whose deadline passed. Return the number of removed claims."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def count(self) -> Dict[str, int]:
+        """Return the number of live claims of each owner."""
+        raise NotImplementedError()
+
+    async def is_claimed(self, guild_id: int, member_id: int) -> bool:
+        return await self.get(guild_id, member_id) is not None
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRegistry(ChallengeRegistry):
+    """Registry of a single process, the default."""
+
+    name = "memory"
+
+    def __init__(self, owner: Optional[str] = None):
+        super().__init__(owner)
+        self._claims: Dict[Tuple[int, int], Claim] = {}
+
+    async def claim(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        now = time.time()
+        claim = self._claims.get((guild_id, member_id))
+        if claim and claim.deadline > now:
+            return False
+        self._claims[guild_id, member_id] = Claim(guild_id, member_id, self.owner, now + ttl)
+        return True
+
+    async def extend(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        claim = self._claims.get((guild_id, member_id))
+        if not claim or claim.owner != self.owner:
+            return False
+        self._claims[guild_id, member_id] = claim._replace(deadline=time.time() + ttl)
+        return True
+
+    async def release(self, guild_id: int, member_id: int) -> bool:
+        claim = self._claims.get((guild_id, member_id))
+        if not claim or claim.owner != self.owner:
+            return False
+        del self._claims[guild_id, member_id]
+        return True
+
+    async def release_all(self) -> int:
+        owned = [key for key, claim in self._claims.items() if claim.owner == self.owner]
+        for key in owned:
+            del self._claims[key]
+        return len(owned)
+
+    async def forget(self, member_id: int) -> int:
+        keys = [key for key in self._claims if key[1] == member_id]
+        for key in keys:
+            del self._claims[key]
+        return len(keys)
+
+    async def get(self, guild_id: int, member_id: int) -> Optional[Claim]:
+        claim = self._claims.get((guild_id, member_id))
+        if claim and claim.deadline > time.time():
+            return claim
+        return None
+
+    async def expired(self, now: Optional[float] = None, limit: int = 100) -> List[Claim]:
+        now = time.time() if now is None else now
+        claims = sorted(
+            (claim for claim in self._claims.values() if claim.deadline <= now),
+            key=lambda claim: claim.deadline,
+        )
+        return claims[:limit]
+
+    async def discard_expired(self, guild_id: int, member_id: int) -> bool:
+        claim = self._claims.get((guild_id, member_id))
+        if not claim or claim.deadline > time.time():
+            return False
+        del self._claims[guild_id, member_id]
+        return True
+
+    async def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = [key for key, claim in self._claims.items() if claim.deadline <= now]
+        for key in expired:
+            del self._claims[key]
+        return len(expired)
+
+    async def count(self) -> Dict[str, int]:
+        now = time.time()
+        counts = {}
+        for claim in self._claims.values():
+            if claim.deadline > now:
+                counts[claim.owner] = counts.get(claim.owner, 0) + 1
+        return counts
+
+
+class SQLiteRegistry(ChallengeRegistry):
+    """Registry shared by the processes of a machine through a SQLite database.
+
+    Every statement is atomic, claims use an upsert that only replaces an expired claim.
+    Queries run in a dedicated thread so the event loop never waits for the database lock.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS challenges ("
+        " guild_id INTEGER NOT NULL,"
+        " member_id INTEGER NOT NULL,"
+        " owner TEXT NOT NULL,"
+        " deadline REAL NOT NULL,"
+        " PRIMARY KEY (guild_id, member_id)"
+        ")",
+        "CREATE INDEX IF NOT EXISTS challenges_deadline ON challenges (deadline)",
+    )
+
+    def __init__(self, path: Union[str, Path], owner: Optional[str] = None):
+        super().__init__(owner)
+        self.path: Path = Path(path)
+        self._connection: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="captcha-registry")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit, each statement is its own transaction.
+            connection = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def _execute(self, query: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self._connect().execute(query, parameters)
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def claim(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        def _claim():
+            now = time.time()
+            cursor = self._execute(
+                "INSERT INTO challenges (guild_id, member_id, owner, deadline) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, member_id) DO UPDATE SET "
+                "owner = excluded.owner, deadline = excluded.deadline "
+                "WHERE challenges.deadline <= ?",
+                (guild_id, member_id, self.owner, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(_claim)
+
+    async def extend(self, guild_id: int, member_id: int, ttl: float) -> bool:
+        def _extend():
+            cursor = self._execute(
+                "UPDATE challenges SET deadline = ? "
+                "WHERE guild_id = ? AND member_id = ? AND owner = ?",
+                (time.time() + ttl, guild_id, member_id, self.owner),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(_extend)
+
+    async def release(self, guild_id: int, member_id: int) -> bool:
+        def _release():
+            cursor = self._execute(
+                "DELETE FROM challenges WHERE guild_id = ? AND member_id = ? AND owner = ?",
+                (guild_id, member_id, self.owner),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(_release)
+
+    async def release_all(self) -> int:
+        def _release_all():
+            return self._execute("DELETE FROM challenges WHERE owner = ?", (self.owner,)).rowcount
+
+        return await self._run(_release_all)
+
+    async def forget(self, member_id: int) -> int:
+        def _forget():
+            return self._execute(
+                "DELETE FROM challenges WHERE member_id = ?", (member_id,)
+            ).rowcount
+
+        return await self._run(_forget)
+
+    async def get(self, guild_id: int, member_id: int) -> Optional[Claim]:
+        def _get():
+            row = self._execute(
+                "SELECT guild_id, member_id, owner, deadline FROM challenges "
+                "WHERE guild_id = ? AND member_id = ? AND deadline > ?",
+                (guild_id, member_id, time.time()),
+            ).fetchone()
+            return Claim(*row) if row else None
+
+        return await self._run(_get)
+
+    async def expired(self, now: Optional[float] = None, limit: int = 100) -> List[Claim]:
+        def _expired():
+            rows = self._execute(
+                "SELECT guild_id, member_id, owner, deadline FROM challenges "
+                "WHERE deadline <= ? ORDER BY deadline LIMIT ?",
+                (time.time() if now is None else now, limit),
+            ).fetchall()
+            return [Claim(*row) for row in rows]
+
+        return await self._run(_expired)
+
+    async def discard_expired(self, guild_id: int, member_id: int) -> bool:
+        def _discard():
+            cursor = self._execute(
+                "DELETE FROM challenges WHERE guild_id = ? AND member_id = ? AND deadline <= ?",
+                (guild_id, member_id, time.time()),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(_discard)
+
+    async def purge_expired(self, now: Optional[float] = None) -> int:
+        def _purge():
+            return self._execute(
+                "DELETE FROM challenges WHERE deadline <= ?",
+                (time.time() if now is None else now,),
+            ).rowcount
+
+        return await self._run(_purge)
+
+    async def count(self) -> Dict[str, int]:
+        def _count():
+            rows = self._execute(
+                "SELECT owner, COUNT(*) FROM challenges WHERE deadline > ? GROUP BY owner",
+                (time.time(),),
+            ).fetchall()
+            return dict(rows)
+
+        return await self._run(_count)
+
+    async def close(self) -> None:
+        def _close():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=False)
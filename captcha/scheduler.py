@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import logging
+from itertools import count
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+log = logging.getLogger("red.predeactor.captcha")
+
+
+class TimeoutScheduler:
+    """Own the deadline of every open challenge in a single heap.
+
+    Only one task sleeps until the closest deadline, then every deadline that expired in the
+    meantime is given to the callback in one batch. Rescheduling or cancelling a key does not
+    touch the heap, old entries are skipped when they are popped.
+    """
+
+    def __init__(self, callback: Callable[[List[Hashable]], None], *, resolution: float = 0.5):
+        """
+        Parameters:
+            callback: A function called with the list of keys whose deadline expired.
+            resolution: Deadlines closer than this number of seconds are fired together.
+        """
+        self.callback = callback
+        self.resolution: float = resolution
+
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._deadlines: Dict[Hashable, Tuple[float, int]] = {}
+        self._counter = count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, delay: float) -> float:
+        """Set (Or replace) the deadline of a key, in seconds from now.
+
+        Return the deadline in loop time.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        entry = (deadline, next(self._counter))
+        self._deadlines[key] = entry
+        heapq.heappush(self._heap, (*entry, key))
+        self._compact()
+
+        if self._task is None or self._task.done():
+            self.start()
+        elif self._heap[0][1] == entry[1]:
+            # This is the new closest deadline, the runner must sleep less.
+            self._wakeup.set()
+        return deadline
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove the deadline of a key. Return True if there was one."""
+        return self._deadlines.pop(key, None) is not None
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Return the deadline of a key in loop time, if any."""
+        entry = self._deadlines.get(key)
+        return entry[0] if entry else None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._runner())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def _compact(self) -> None:
+        # Rescheduled keys leave old entries in the heap, rebuild it when they are the majority.
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._deadlines):
+            self._heap = [(*entry, key) for key, entry in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_expired(self, now: float) -> List[Hashable]:
+        expired = []
+        while self._heap and self._heap[0][0] <= now + self.resolution:
+            deadline, number, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != (deadline, number):
+                continue  # Cancelled or rescheduled.
+            del self._deadlines[key]
+            expired.append(key)
+        return expired
+
+    async def _runner(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            expired = self._pop_expired(loop.time())
+            if expired:
+                try:
+                    self.callback(expired)
+                except Exception as e:
+                    log.error("Error while expiring challenges.", exc_info=e)
+            timeout = self._heap[0][0] - loop.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
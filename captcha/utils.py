@@ -1,23 +1,30 @@
-from typing import List
+from typing import List, Optional
 
 import discord
 from redbot.core.utils import chat_formatting as form
 
+from .permissions import PermissionCache
 
-async def check_permissions_in_channel(permissions: List[str], channel: discord.TextChannel):
+
+async def check_permissions_in_channel(
+    permissions: List[str], channel: discord.TextChannel, cache: Optional[PermissionCache] = None
+):
     """Function to checks if the permissions are available in a guild.
     This will return a list of the missing permissions.
+
+    The permissions of the bot are resolved once and kept in ``cache`` if given.
     """
-    missing_perm = []
-    for permission in permissions:
-        if not getattr(channel.permissions_for(channel.guild.me), permission):
-            missing_perm.append(permission)
-    return missing_perm
+    if cache is not None:
+        return cache.missing(permissions, channel)
+    channel_permissions = channel.permissions_for(channel.guild.me)
+    return [
+        permission for permission in permissions if not getattr(channel_permissions, permission)
+    ]
 
 
-def build_kick_embed(guild: discord.Guild, reason: str):
+def build_kick_embed(guild: discord.Guild, reason: str, *, banned: bool = False):
     embed = discord.Embed(
-        title=f"You have been kicked from {guild.name}.",
+        title=f"You have been {'banned' if banned else 'kicked'} from {guild.name}.",
         description="",
         color=discord.Colour.red().value,
     )
@@ -355,7 +355,5 @@ class Captcher(Core):
             await asyncio.sleep(5)
             if not captched and not has_been_kicked:
                 await self._kicker(user, "Failed the captcha.")
-            await bot_message.delete()
-            await user_message.delete()
-            await final.delete()
+            await channel.delete_messages([bot_message, user_message, final])
             del self.in_challenge[user.id]
@@ -57,7 +57,13 @@ class Core(commands.Cog):
             temprole=None,
         )
         self.path = bundled_data_path(self)
+        # Fonts are only listed and loaded once, the generator keep them in memory.
+        self.generator = ImageCaptcha(
+            fonts=[str(self.path / f) for f in listdir(self.path) if isfile(join(self.path, f))]
+        )
         self.in_challenge = {}  # Try to improve this part, it sound like pain and killing.
+        # Bot's permissions by (guild ID, channel ID), invalidated by the listeners below.
+        self._permissions_cache = {}
         super(Core, self).__init__()
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
@@ -80,12 +86,9 @@ class Core(commands.Cog):
             BytesIO: The object that contain the image.
         """
         code = str(randint(1000, 999999))  # Cannot start with leading 0...
-        file_fonts = [
-            f"{self.path}/" + f for f in listdir(self.path) if isfile(join(self.path, f))
-        ]
         return (
             code,
-            ImageCaptcha(fonts=file_fonts).generate(code),
+            self.generator.generate(code),
         )
 
     async def challenger(
@@ -134,8 +137,7 @@ class Core(commands.Cog):
             )
         return await self._challenge(member, channel, start_reason, start_message)
 
-    @staticmethod
-    def _permissions_checker(permissions: list, channel: discord.TextChannel):
+    def _permissions_checker(self, permissions: list, channel: discord.TextChannel):
         """Function to checks if the permissions are available.
 
         Parameters:
@@ -146,9 +148,14 @@ class Core(commands.Cog):
             bool or str: If all permissions are given to bot, it will return
              True, else it return a text which include missing permissions.
         """
+        key = (channel.guild.id, channel.id)
+        channel_permissions = self._permissions_cache.get(key)
+        if channel_permissions is None:
+            channel_permissions = channel.permissions_for(channel.guild.me)
+            self._permissions_cache[key] = channel_permissions
         missing_perm = []
         for permission in permissions:
-            if not getattr(channel.permissions_for(channel.guild.me), permission):
+            if not getattr(channel_permissions, permission):
                 missing_perm.append(permission.replace("_", " ").title())
         if missing_perm:
             return (
@@ -628,9 +635,8 @@ class Core(commands.Cog):
         await asyncio.sleep(5)
         if not has_been_kicked and not success:
             await self._kicker(member, "Failed the captcha.")
-        await bot_message.delete()
-        await user_message.delete()
-        await final.delete()
+        # One bulk request instead of one request per message.
+        await guild_channel.delete_messages([bot_message, user_message, final])
         del self.in_challenge[member.id]
 
     @commands.Cog.listener()
@@ -644,3 +650,22 @@ class Core(commands.Cog):
         bot_message = self.in_challenge[member.id]["bot_message"]
         await bot_message.delete()
         del self.in_challenge[member.id]
+
+    def _forget_permissions(self, guild: discord.Guild, channel_id: int = None):
+        for key in list(self._permissions_cache):
+            if key[0] == guild.id and channel_id in (None, key[1]):
+                del self._permissions_cache[key]
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        self._forget_permissions(after.guild, after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if after.is_default() or after in after.guild.me.roles:
+            self._forget_permissions(after.guild)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self._forget_permissions(after.guild)
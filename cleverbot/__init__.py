@@ -4,4 +4,6 @@ __red_end_user_data_statement__ = "This cog does not save data about users persi
 
 
 async def setup(bot):
-    bot.add_cog(CleverBot(bot))
+    cog = CleverBot(bot)
+    bot.add_cog(cog)
+    await cog.initialize()
@@ -22,10 +22,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from collections import OrderedDict, deque
 from enum import Enum
 
 import aiohttp
 
+API_URL = "https://public-api.travitia.xyz/talk"
+
 
 class Emotion(Enum):
     """Enum used to pass an emotion to the API."""
@@ -51,27 +54,42 @@ class InvalidKey(Exception):
 
 
 class DictContext:
-    """Context for API requests."""
+    """Context for API requests.
+
+    The last ``window`` queries of each ID are kept. Once more than ``max_users`` IDs are
+    tracked, the least recently used one is forgotten.
+    """
 
-    def __init__(self):
-        self._storage = dict()
+    def __init__(self, window: int = 2, max_users: int = 1000):
+        if window < 1 or max_users < 1:
+            raise ValueError("window and max_users must be positive.")
+        self.window = window
+        self.max_users = max_users
+        self._storage = OrderedDict()
+
+    def __len__(self):
+        return len(self._storage)
 
     def update_context(self, id_, query):
         """Pushes data to the Context."""
         try:
-            ctx = self._storage[id_]
+            queries = self._storage[id_]
         except KeyError:
-            li_temp = list()
-            li_temp.append(query)
-            self._storage[id_] = li_temp
-            return dict(text=query)
+            queries = self._storage[id_] = deque(maxlen=self.window)
+            if len(self._storage) > self.max_users:
+                self._storage.popitem(last=False)
         else:
-            self._storage[id_].append(query)
-            if len(self._storage[id_]) > 2:
-                self._storage[id_].pop(0)
-                return dict(text=query, context=ctx)
+            self._storage.move_to_end(id_)
+        full = len(queries) == self.window
+        queries.append(query)
+        if full:
+            return dict(text=query, context=list(queries))
         return dict(text=query)
 
+    def forget(self, id_):
+        """Removes the queries of an ID."""
+        self._storage.pop(id_, None)
+
 
 class Response:
     """
@@ -96,18 +114,27 @@ class Response:
 
 
 class Cleverbot:
-    """The client to use for API interactions."""
+    """The client to use for API interactions.
+
+    A session passed to the client is shared, it is left open by `close()`.
+    """
 
     def __init__(
-        self, api_key: str, session: aiohttp.ClientSession = None, context: DictContext = None
+        self,
+        api_key: str,
+        session: aiohttp.ClientSession = None,
+        context: DictContext = None,
+        api_url: str = None,
     ):
-        self.context = context or None
+        self.context = None
         self.session = session or None
+        self._owns_session = session is None
         self.api_key = api_key  # API key for the Cleverbot API
-        self.api_url = "https://public-api.travitia.xyz/talk"  # URL for requests
+        self.api_url = api_url or API_URL  # URL for requests
         if session and not isinstance(session, aiohttp.ClientSession):
             raise TypeError("Session must be an aiohttp.ClientSession.")
-        if context:
+        # An empty DictContext is falsy, it must still be used.
+        if context is not None:
             self.set_context(context)
 
     def set_context(self, context: DictContext):
@@ -117,10 +144,8 @@ class Cleverbot:
         else:
             self.context = context
 
-    async def ask(self, query: str, id_=None, *, emotion: Emotion = Emotion.neutral):
-        """Queries the Cleverbot API."""
-        if not self.session:
-            self.session = aiohttp.ClientSession()  # Session for requests
+    def make_payload(self, query: str, id_=None, *, emotion: Emotion = Emotion.neutral):
+        """Builds the data of a query, pushing it to the Context."""
         if not isinstance(emotion, Emotion):
             raise ValueError("emotion must be an enum of async_cleverbot.Emotion.")
         if isinstance(self.context, DictContext):
@@ -128,8 +153,18 @@ class Cleverbot:
         else:
             ctx = dict(text=query)
         ctx["emotion"] = emotion.value
+        return ctx
+
+    async def request(self, payload: dict):
+        """Sends the data built by `make_payload()` to the API.
+
+        The Context is left untouched, a failed request can be sent again.
+        """
+        if not self.session:
+            self.session = aiohttp.ClientSession()  # Session for requests
+            self._owns_session = True
         headers = dict(authorization=self.api_key)
-        async with self.session.post(self.api_url, data=ctx, headers=headers) as req:
+        async with self.session.post(self.api_url, data=payload, headers=headers) as req:
             try:
                 resp = await req.json()
             except aiohttp.ContentTypeError:
@@ -147,7 +182,12 @@ class Cleverbot:
 
         return Response.from_raw(resp)
 
+    async def ask(self, query: str, id_=None, *, emotion: Emotion = Emotion.neutral):
+        """Queries the Cleverbot API."""
+        return await self.request(self.make_payload(query, id_, emotion=emotion))
+
     async def close(self):
-        """Closes the aiohttp session."""
-        if self.session:
+        """Closes the aiohttp session, unless it was given to the client."""
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
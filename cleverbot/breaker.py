@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from .asynccleverbot import cleverbot as ac
+
+log = logging.getLogger("predeactor.cleverbot")
+
+T = TypeVar("T")
+
+# Errors worth retrying, the others (like an invalid key) would fail the same way again.
+TRANSIENT_ERRORS = (ac.APIDown, aiohttp.ClientError, asyncio.TimeoutError)
+# Attempts made for a question before giving up.
+RETRIES = 3
+# Maximum seconds before the second attempt, doubled after each attempt. The real delay is
+# picked randomly below it, so failed requests are not retried all at once.
+BACKOFF = 0.5
+
+
+class CircuitOpen(Exception):
+    """Raised instead of making a request while the API is considered down."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("The API is unavailable.")
+        self.retry_after: float = retry_after
+
+
+class CircuitBreaker:
+    """Stop making requests to an API that keeps failing.
+
+    After ``failure_threshold`` failures in a row the circuit opens, requests fail at once
+    with CircuitOpen. Once ``reset_timeout`` seconds passed, a single request is let through
+    to probe the API: the circuit closes if it succeeds, or opens again if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+
+        self.failures: int = 0
+        self.rejected: int = 0
+        self._opened_at: Optional[float] = None
+        self._probing: bool = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _before_request(self) -> bool:
+        """Return True if the request is the probe of a half-open circuit.
+
+        Raises:
+            CircuitOpen: The request must not be made.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise CircuitOpen(max(self._opened_at + self.reset_timeout - time.monotonic(), 0))
+
+    def _success(self) -> None:
+        if self._opened_at is not None:
+            log.info("Travitia answers again, closing the circuit.")
+        self.failures = 0
+        self._opened_at = None
+
+    def _failure(self, probe: bool) -> None:
+        self.failures += 1
+        if probe or (self._opened_at is None and self.failures >= self.failure_threshold):
+            if not probe:
+                log.warning(
+                    "Travitia failed {count} times, opening the circuit.".format(
+                        count=self.failures
+                    )
+                )
+            self._opened_at = time.monotonic()
+
+    async def call(self, function: Callable[[], Awaitable[T]]) -> T:
+        """Call ``function``, retrying transient errors with a jittered exponential backoff.
+
+        Raises:
+            CircuitOpen: The API is considered down, no request was made.
+        """
+        delay = BACKOFF
+        for attempt in range(RETRIES):
+            probe = self._before_request()
+            try:
+                result = await function()
+            except TRANSIENT_ERRORS:
+                self._failure(probe)
+                # Nothing left to try if the API is considered down now.
+                if attempt == RETRIES - 1 or self._opened_at is not None:
+                    raise
+            else:
+                self._success()
+                return result
+            finally:
+                if probe:
+                    self._probing = False
+            await asyncio.sleep(random.uniform(0, delay))
+            delay *= 2
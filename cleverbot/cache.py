@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# Characters ignored at the end of a question, "Hi!" and "hi" get the same answer.
+TRAILING_PUNCTUATION = " .!?~"
+
+
+def normalize_question(question: str) -> str:
+    """Return the question in lowercase, with its whitespaces collapsed."""
+    return " ".join(question.casefold().split()).rstrip(TRAILING_PUNCTUATION)
+
+
+class ResponseCache:
+    """TTL and LRU cache of Cleverbot's answers to questions asked without context.
+
+    Identical questions asked while the first one is still waiting for Travitia share its
+    request instead of making their own.
+    """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 1000):
+        self.ttl: float = ttl
+        self.max_size: int = max_size
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits: int = 0  # Answered from the cache.
+        self.coalesced: int = 0  # Answered by a request already running.
+        self.misses: int = 0  # Answered by a new request.
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def saved(self) -> int:
+        """Requests that were not made thanks to the cache."""
+        return self.hits + self.coalesced
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.saved + self.misses
+        return self.saved / total if total else 0.0
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached answer or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def fetch(self, key: Hashable, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached answer, or the answer of ``request`` which is then cached.
+
+        Errors are not cached, they are raised to every caller sharing the request.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task, so the request goes on if its first caller is cancelled.
+            future = self._inflight[key] = asyncio.ensure_future(request())
+            future.add_done_callback(lambda future: self._done(key, future))
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.set(key, future.result())
+
+    def clear(self) -> None:
+        self._entries.clear()
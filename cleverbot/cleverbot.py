@@ -1,10 +1,11 @@
 import logging
+from collections import deque
 from datetime import datetime
 
 import discord
 from redbot.core import commands
 
-from .core import Core, apicheck
+from .core import QUEUE_LENGTH, Core, apicheck
 
 log = logging.getLogger("predeactor.cleverbot")
 
@@ -21,13 +22,14 @@ class CleverBot(Core):
         You won't have a discussion with Cleverbot, you're just
         asking a single question."""
         async with ctx.typing():
-            session = await self._make_cleverbot_session()
-            answer, answered = await self.ask_question(session, question, ctx.author.id)
+            session = await self._make_cleverbot_session(context=False)
+            answer, answered, _ = await self.ask_question(
+                session, question, ctx.author.id, cached=True
+            )
             if answered:
                 message = "{user}, {answer}".format(user=ctx.author.name, answer=answer)
             else:
                 message = answer
-            await session.close()
             await ctx.send(message)
 
     @apicheck()
@@ -36,18 +38,19 @@ class CleverBot(Core):
         """Start a conversation with Cleverbot
         You don't need to use a prefix or the command using this mode."""
 
-        if str(ctx.author.id) in self.conversation:
+        if self._has_conversation(ctx.author.id):
             await ctx.send("There's already a conversation running. Say `close` to " "stop it.")
             return
 
         session = await self._make_cleverbot_session()
         data = {
             "session": session,
-            "channel": ctx.channel.id,
             "timer": datetime.now(),
             "typing": False,
+            # Messages received while waiting for an answer.
+            "queue": deque(maxlen=QUEUE_LENGTH),
         }
-        self.conversation[str(ctx.author.id)] = data
+        self._add_conversation(ctx.channel.id, ctx.author.id, data)
 
         await ctx.send(
             "Starting a new Cleverbot session!\n\nSay `close` to stop the conversation"
@@ -58,48 +61,64 @@ class CleverBot(Core):
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """The CleverBot listener that will send a message in case a user is in a conversation."""
-        ctx = await self.bot.get_context(message)
-
-        # If user is not using conversation
-        if str(ctx.author.id) not in self.conversation:
-            return
-        session = self.conversation[str(ctx.author.id)]["session"]
-        timer = self.conversation[str(ctx.author.id)]["timer"]
-        channel = self.conversation[str(ctx.author.id)]["channel"]
-        # If the timer is exceeded.
-        if (datetime.now() - timer).seconds > 300:
-            channel = self.bot.get_channel(channel)
-            await channel.send(self._message_by_timeout())
-            await session.close()
-            del self.conversation[str(ctx.author.id)]
+        # Most messages are not part of a conversation, they must be discarded before any await.
+        key = (message.channel.id, message.author.id)
+        data = self.conversation.get(key)
+        if data is None:
             return
-        # If message is not in the good channel
-        if ctx.channel.id is not channel:
-            return
-        # If bot is typing
-        if self.conversation[str(ctx.author.id)]["typing"]:
+        session = data["session"]
+        # If the timer is exceeded, the sweeper did not pass yet.
+        if self._is_expired(data):
+            await self._expire_conversation(*key)
             return
         # If the string start with a prefix
-        if message.content.startswith(tuple(await self.bot.get_valid_prefixes())):
+        if message.content.startswith(await self._get_prefixes(message.guild)):
             return
         # If user is closing
         if message.content.lower() == "close":
+            self._remove_conversation(*key)
             await session.close()
-            del self.conversation[str(ctx.author.id)]
-            await ctx.send("Session closed!")
+            await message.channel.send("Session closed!")
+            return
+        # If bot is typing, the message is merged into the next question.
+        if data["typing"]:
+            data["queue"].append(message.content)
             return
         # if all checks pass
-        async with ctx.typing():
-            self.conversation[str(ctx.author.id)]["typing"] = True
-            answer, answered = await self.ask_question(session, message.content, ctx.author.id)
-            if answered:
-                message = "{user}, {answer}".format(user=ctx.author.mention, answer=answer)
-                self.conversation[str(ctx.author.id)]["timer"] = datetime.now()
-                exiting = False
-            else:
-                message = answer
-                exiting = True
-            await ctx.send(message)
-            self.conversation[str(ctx.author.id)]["typing"] = False
-            if exiting:
-                await session.close()
+        data["typing"] = True
+        question = message.content
+        try:
+            async with message.channel.typing():
+                while True:
+                    answer, answered, keep_open = await self.ask_question(
+                        session, question, message.author.id
+                    )
+                    if not keep_open:
+                        self._remove_conversation(*key)
+                        await message.channel.send(answer)
+                        await session.close()
+                        return
+                    data["timer"] = datetime.now()
+                    if not answered:
+                        # Cleverbot is unavailable, the messages said meanwhile are dropped.
+                        data["queue"].clear()
+                        await message.channel.send(answer)
+                        return
+                    await message.channel.send(
+                        "{user}, {answer}".format(user=message.author.mention, answer=answer)
+                    )
+                    # Stop if nothing was said meanwhile, or if the conversation was closed.
+                    if not data["queue"] or self.conversation.get(key) is not data:
+                        return
+                    question = "\n".join(data["queue"])
+                    data["queue"].clear()
+        finally:
+            data["typing"] = False
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context):
+        """Forget the cached prefixes once they are changed."""
+        if ctx.command.qualified_name == "set prefix":
+            self._forget_prefixes()
+        elif ctx.command.qualified_name == "set serverprefix" and ctx.guild:
+            self._forget_prefixes(ctx.guild.id)
@@ -1,12 +1,46 @@
+import asyncio
+import logging
 import random
-from typing import Literal, Optional
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Literal, Optional, Tuple
 
+import aiohttp
 import discord
-from redbot.core import checks, commands
+from redbot.core import Config, checks, commands
 from redbot.core.bot import Red
-from redbot.core.utils.chat_formatting import humanize_list
+from redbot.core.utils.chat_formatting import box, humanize_list
 
 from .asynccleverbot import cleverbot as ac
+from .breaker import CircuitBreaker, CircuitOpen
+from .cache import ResponseCache, normalize_question
+
+log = logging.getLogger("predeactor.cleverbot")
+
+# Seconds without message before a conversation is closed.
+CONVERSATION_TIMEOUT = 300
+# Seconds between two checks of the idle conversations.
+SWEEP_INTERVAL = 30
+# Idle conversations closed at once, their notices are sent concurrently.
+SWEEP_BATCH = 25
+
+# Messages of a conversation kept while waiting for an answer, merged into the next question.
+QUEUE_LENGTH = 5
+# Requests to Travitia running at once, the others wait for their turn.
+MAX_REQUESTS = 10
+
+# Queries of each user sent to Cleverbot as context, and users whose context is kept.
+CONTEXT_WINDOW = 2
+CONTEXT_USERS = 1000
+
+DEFAULT_GLOBAL = {
+    "cache": False,  # Whether answers to the ask command are cached.
+    "cache_ttl": 3600,  # Seconds an answer is cached.
+}
+
+# Seconds the prefixes of a guild are cached. The cache is also cleared when prefixes are
+# changed with Red's commands, this only covers other ways of changing them.
+PREFIXES_TTL = 300
 
 
 class Core(commands.Cog):
@@ -30,9 +64,121 @@ class Core(commands.Cog):
 
     def __init__(self, bot: Red):
         self.bot = bot
-        self.conversation = {}
+        self.data = Config.get_conf(self, identifier=495954058, force_registration=True)
+        self.data.register_global(**DEFAULT_GLOBAL)
+        self.cache: Optional[ResponseCache] = None
+        self.conversation: Dict[Tuple[int, int], dict] = {}  # (Channel ID, User ID): Data
+        self._conversation_channels: Dict[int, int] = {}  # User ID: Channel ID
+        self._prefixes: Dict[Optional[int], Tuple[float, Tuple[str, ...]]] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._requests = asyncio.Semaphore(MAX_REQUESTS)
+        self.breaker = CircuitBreaker()
+        # Shared by the conversations, memory does not grow with the number of users.
+        self.context = ac.DictContext(window=CONTEXT_WINDOW, max_users=CONTEXT_USERS)
+        self._sweeper: Optional[asyncio.Task] = None
         super().__init__()
 
+    async def initialize(self):
+        if await self.data.cache():
+            self.cache = ResponseCache(ttl=await self.data.cache_ttl())
+        else:
+            self.cache = None
+
+    def cog_unload(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        asyncio.create_task(self._close_session())
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The HTTP session shared by every Cleverbot client.
+
+        Connections to Travitia are kept alive, so questions do not pay for a new TCP and TLS
+        handshake.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=50, keepalive_timeout=60, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=30, connect=10),
+            )
+        return self._session
+
+    def _has_conversation(self, user_id: int) -> bool:
+        return user_id in self._conversation_channels
+
+    def _add_conversation(self, channel_id: int, user_id: int, data: dict):
+        self.conversation[channel_id, user_id] = data
+        self._conversation_channels[user_id] = channel_id
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    def _remove_conversation(self, channel_id: int, user_id: int) -> Optional[dict]:
+        if self._conversation_channels.get(user_id) == channel_id:
+            del self._conversation_channels[user_id]
+        self.context.forget(user_id)
+        return self.conversation.pop((channel_id, user_id), None)
+
+    @staticmethod
+    def _is_expired(data: dict, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        return now - data["timer"] > timedelta(seconds=CONVERSATION_TIMEOUT)
+
+    async def _expire_conversation(self, channel_id: int, user_id: int):
+        data = self._remove_conversation(channel_id, user_id)
+        if data is None:
+            return
+        await data["session"].close()
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            try:
+                await channel.send(self._message_by_timeout())
+            except discord.HTTPException:
+                pass
+
+    async def _sweep(self):
+        # Stops once there is no conversation left, restarted by the next conversation.
+        while self.conversation:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            now = datetime.now()
+            expired = [
+                key
+                for key, data in self.conversation.items()
+                if not data["typing"] and self._is_expired(data, now)
+            ]
+            for index in range(0, len(expired), SWEEP_BATCH):
+                results = await asyncio.gather(
+                    *(
+                        self._expire_conversation(*key)
+                        for key in expired[index : index + SWEEP_BATCH]
+                    ),
+                    return_exceptions=True,
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        log.error("Error while closing an idle conversation.", exc_info=result)
+
+    async def _get_prefixes(self, guild: Optional[discord.Guild]) -> Tuple[str, ...]:
+        """Return the prefixes of a guild, cached."""
+        guild_id = guild.id if guild else None
+        cached = self._prefixes.get(guild_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        prefixes = tuple(await self.bot.get_valid_prefixes(guild))
+        self._prefixes[guild_id] = (time.monotonic() + PREFIXES_TTL, prefixes)
+        return prefixes
+
+    def _forget_prefixes(self, guild_id: Optional[int] = None):
+        """Clear the cached prefixes of a guild, or of every guild if not given."""
+        if guild_id is None:
+            self._prefixes.clear()
+        else:
+            self._prefixes.pop(guild_id, None)
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """Thanks Sinbad!"""
         pre_processed = super().format_help_for_context(ctx)
@@ -48,21 +194,61 @@ class Core(commands.Cog):
         # @apicheck() do it automatically.
         return travitia.get("api_key")
 
-    async def _make_cleverbot_session(self):
-        cleverbot_session = ac.Cleverbot(await self._get_api_key(), context=ac.DictContext())
+    async def _make_cleverbot_session(self, context: bool = True):
+        """Make a Cleverbot client. Without context, questions are answered on their own."""
+        cleverbot_session = ac.Cleverbot(
+            await self._get_api_key(),
+            session=self.session,
+            context=self.context if context else None,
+        )
         return cleverbot_session
 
-    @staticmethod
-    async def ask_question(session, question: str, user_id: Optional[int] = None):
+    async def ask_question(
+        self, session, question: str, user_id: Optional[int] = None, *, cached: bool = False
+    ):
+        """Ask a question, using the response cache if ``cached`` and the cache is enabled.
+
+        Only questions asked without context can be cached.
+
+        Returns
+        -------
+        tuple:
+            The answer or the message to send instead, whether Cleverbot answered, and
+            whether the conversation can go on.
+        """
+        emotion = ac.Emotion.neutral
+
+        async def request():
+            # Built once, retrying must not push the question to the context again.
+            payload = session.make_payload(
+                question, user_id if user_id is not None else "00", emotion=emotion
+            )
+
+            async def attempt():
+                async with self._requests:
+                    return await session.request(payload)
+
+            return await self.breaker.call(attempt)
+
         try:
-            answer = await session.ask(question, user_id if user_id is not None else "00")
-            answered = True
+            if cached and self.cache is not None:
+                answer = await self.cache.fetch(
+                    (normalize_question(question), emotion.value), request
+                )
+            else:
+                answer = await request()
+        except CircuitOpen as e:
+            # The conversation stays open, the API is likely to come back soon.
+            message = "Cleverbot is unavailable right now, try again in {seconds} seconds.".format(
+                seconds=max(round(e.retry_after), 1)
+            )
+            return message, False, True
         except Exception as e:
-            answer = "An error happened: {error}. Please try again later. Session closed.".format(
+            message = "An error happened: {error}. Please try again later. Session closed.".format(
                 error=str(e)
             )
-            answered = False
-        return answer, answered
+            return message, False, False
+        return answer, True, True
 
     @staticmethod
     def _message_by_timeout():
@@ -98,6 +284,61 @@ class Core(commands.Cog):
             )
         await ctx.send("API key for `travitia` registered.")
 
+    @checks.is_owner()
+    @commands.group()
+    async def cleverbotcache(self, ctx: commands.Context):
+        """Cache the answers to the questions asked with the ask command.
+
+        Identical questions asked at the same time also share one request to the API.
+        """
+
+    @cleverbotcache.command(name="toggle")
+    async def cache_toggle(self, ctx: commands.Context, ttl: int = 3600):
+        """Enable or disable the cache.
+
+        ``ttl``: Seconds an answer is cached.
+        """
+        if ttl < 1:
+            await ctx.send("The TTL must be at least 1 second.")
+            return
+        enabled = not await self.data.cache()
+        await self.data.cache.set(enabled)
+        await self.data.cache_ttl.set(ttl)
+        await self.initialize()
+        await ctx.send(
+            "The cache is now {state}.".format(state="enabled" if enabled else "disabled")
+        )
+
+    @cleverbotcache.command(name="stats")
+    async def cache_stats(self, ctx: commands.Context):
+        """Show how many requests the cache saved."""
+        if self.cache is None:
+            await ctx.send("The cache is disabled.")
+            return
+        message = (
+            "answers cached: {size}\n"
+            "hits: {hits}\n"
+            "shared requests: {coalesced}\n"
+            "requests made: {misses}\n"
+            "requests saved: {saved}\n"
+            "hit ratio: {ratio:.1%}"
+        ).format(
+            size=len(self.cache),
+            hits=self.cache.hits,
+            coalesced=self.cache.coalesced,
+            misses=self.cache.misses,
+            saved=self.cache.saved,
+            ratio=self.cache.hit_ratio,
+        )
+        await ctx.send(box(message, lang="yaml"))
+
+    @cleverbotcache.command(name="clear")
+    async def cache_clear(self, ctx: commands.Context):
+        """Remove the cached answers."""
+        if self.cache is not None:
+            self.cache.clear()
+        await ctx.tick()
+
 
 def apicheck():
     """
@@ -4,3 +4,4 @@ from .lyrics import Lyrics
 def setup(bot):
     cog = Lyrics(bot)
     bot.add_cog(cog)
+    bot.loop.create_task(cog.initialize())
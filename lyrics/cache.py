@@ -0,0 +1,143 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ksoftapi.models import LyricResult
+
+log = logging.getLogger("red.predeactor.lyrics")
+
+# Queries kept in memory.
+MEMORY_SIZE = 128
+# Seconds the results of a query are kept, lyrics rarely change.
+TTL = 7 * 24 * 60 * 60
+
+
+def normalize_query(query: str) -> str:
+    """Return the query in lowercase, with its whitespaces collapsed.
+
+    The query must already be cleaned with BOT_SONG_RE.
+    """
+    return " ".join(query.casefold().split())
+
+
+class LyricsCache:
+    """Two-tier cache of KSoft's search results, keyed on the normalized query.
+
+    The most recent queries are kept in memory. Every result is also written gzip-compressed
+    to ``directory``, one file per query, so they survive restarts. Files are read and
+    written in a thread.
+    """
+
+    def __init__(self, directory: Path, *, memory_size: int = MEMORY_SIZE, ttl: float = TTL):
+        self.directory: Path = directory
+        self.memory_size: int = memory_size
+        self.ttl: float = ttl
+
+        # Query: (Expiry as UNIX time, Results)
+        self._memory: "OrderedDict[str, Tuple[float, List[LyricResult]]]" = OrderedDict()
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+    def _path(self, query: str) -> Path:
+        name = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        return self.directory / "{name}.json.gz".format(name=name)
+
+    async def get(self, query: str) -> Optional[List[LyricResult]]:
+        """Return the cached results of a normalized query, or None."""
+        entry = self._memory.get(query)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._memory.move_to_end(query)
+                self.memory_hits += 1
+                return entry[1]
+            del self._memory[query]
+        try:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._read, query)
+        except (OSError, EOFError, KeyError, ValueError) as e:
+            log.warning("Unreadable lyrics cache entry, ignoring it.", exc_info=e)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self._remember(query, *entry)
+        return entry[1]
+
+    async def set(self, query: str, results: List[LyricResult]) -> None:
+        """Cache the results of a normalized query."""
+        expiry = time.time() + self.ttl
+        self._remember(query, expiry, results)
+        raw = [result.raw for result in results]
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, query, expiry, raw)
+        except OSError as e:
+            log.warning("Cannot write the lyrics cache.", exc_info=e)
+
+    async def purge(self, query: Optional[str] = None) -> int:
+        """Remove the results of a normalized query, or every result. Return how many files
+        were removed."""
+        if query is not None:
+            self._memory.pop(query, None)
+            paths = [self._path(query)]
+        else:
+            self._memory.clear()
+            paths = None
+
+        def _purge():
+            removed = 0
+            for path in paths if paths is not None else self.directory.glob("*.json.gz"):
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            return removed
+
+        return await asyncio.get_running_loop().run_in_executor(None, _purge)
+
+    def disk_usage(self) -> Tuple[int, int]:
+        """Return the number of files and their size in bytes."""
+        files = list(self.directory.glob("*.json.gz"))
+        return len(files), sum(path.stat().st_size for path in files)
+
+    def _remember(self, query: str, expiry: float, results: list) -> None:
+        self._memory[query] = (expiry, results)
+        self._memory.move_to_end(query)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _read(self, query: str):
+        path = self._path(query)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        # Hash collisions are very unlikely but cheap to detect.
+        if data["query"] != query:
+            return None
+        if data["expiry"] <= time.time():
+            path.unlink()
+            return None
+        return data["expiry"], [LyricResult(raw) for raw in data["results"]]
+
+    def _write(self, query: str, expiry: float, raw: List[dict]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(query)
+        temporary = path.with_suffix(".tmp")
+        with gzip.open(temporary, "wt", encoding="utf-8") as file:
+            json.dump({"query": query, "expiry": expiry, "results": raw}, file)
+        # Readers never see a partly written file.
+        temporary.replace(path)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from ksoftapi.models import LyricResult
+
+# Results returned by a search of the index.
+SEARCH_LIMIT = 10
+# Weight of the title, artist and lyrics columns when ranking results.
+WEIGHTS = (10.0, 5.0, 1.0)
+
+# Words a query needs to be looked up as a line of lyrics. Shorter queries share words with
+# too many songs, they only match titles and artists.
+MIN_LYRICS_WORDS = 4
+
+WORD_RE = re.compile(r"\w+")
+
+
+def build_match(query: str) -> Optional[str]:
+    """Return a full-text query matching songs whose title and artist contain every word of
+    ``query``, or whose lyrics contain ``query`` as a phrase."""
+    words = WORD_RE.findall(query.casefold())
+    if not words:
+        return None
+    # Quoted, so words like "and" or "near" are not read as operators.
+    match = "{{name artist}} : ({words})".format(
+        words=" ".join('"{word}"'.format(word=word) for word in words)
+    )
+    if len(words) >= MIN_LYRICS_WORDS:
+        match += ' OR lyrics : "{phrase}"'.format(phrase=" ".join(words))
+    return match
+
+
+class LyricsIndex:
+    """Full-text index of the songs fetched from KSoft.Si, stored in SQLite.
+
+    Titles, artists and lyrics are indexed with FTS5, so a song can be found again from a
+    line of its lyrics. Songs are added as they are fetched, an already indexed song is
+    replaced. Queries run in a dedicated thread, never on the event loop.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS songs ("
+        " rowid INTEGER PRIMARY KEY,"
+        " ksoft_id TEXT NOT NULL UNIQUE,"
+        " raw TEXT NOT NULL"
+        ")",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS songs_text USING fts5("
+        " name, artist, lyrics, tokenize = 'unicode61 remove_diacritics 2'"
+        ")",
+    )
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lyrics-index")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def add(self, results: List[LyricResult]) -> None:
+        """Index songs, replacing the ones already indexed."""
+        songs = [(result.id, result.raw) for result in results if result.lyrics]
+        if not songs:
+            return
+
+        def _add():
+            connection = self._connect()
+            with connection:
+                for ksoft_id, raw in songs:
+                    row = connection.execute(
+                        "SELECT rowid FROM songs WHERE ksoft_id = ?", (ksoft_id,)
+                    ).fetchone()
+                    if row:
+                        connection.execute("DELETE FROM songs_text WHERE rowid = ?", row)
+                        connection.execute(
+                            "UPDATE songs SET raw = ? WHERE rowid = ?", (json.dumps(raw), row[0])
+                        )
+                        rowid = row[0]
+                    else:
+                        rowid = connection.execute(
+                            "INSERT INTO songs (ksoft_id, raw) VALUES (?, ?)",
+                            (ksoft_id, json.dumps(raw)),
+                        ).lastrowid
+                    connection.execute(
+                        "INSERT INTO songs_text (rowid, name, artist, lyrics) VALUES (?, ?, ?, ?)",
+                        (rowid, raw["name"], raw["artist"], raw["lyrics"]),
+                    )
+
+        await self._run(_add)
+
+    async def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[LyricResult]:
+        """Return the songs matching the query, the best matches first.
+
+        Every word of the query must be in the title or the artist, or the whole query in the
+        lyrics. A song sharing a few common words with the query is not a match, KSoft.Si is
+        asked instead.
+        """
+        match = build_match(query)
+        if match is None:
+            return []
+
+        def _search():
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT songs.raw FROM songs_text JOIN songs ON songs.rowid = songs_text.rowid "
+                    "WHERE songs_text MATCH ? ORDER BY bm25(songs_text, ?, ?, ?) LIMIT ?",
+                    (match, *WEIGHTS, limit),
+                )
+                .fetchall()
+            )
+            return [LyricResult(json.loads(raw)) for raw, in rows]
+
+        return await self._run(_search)
+
+    async def count(self) -> int:
+        def _count():
+            return self._connect().execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+        return await self._run(_count)
+
+    async def clear(self) -> None:
+        def _clear():
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM songs")
+                connection.execute("DELETE FROM songs_text")
+
+        await self._run(_clear)
+
+    async def close(self) -> None:
+        def _close():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=False)
@@ -1,22 +1,30 @@
+import asyncio
+import contextlib
 import re
 from asyncio import create_task
 from asyncio.exceptions import TimeoutError as Te
-from typing import Literal
+from typing import Awaitable, Callable, Literal, Optional, Set, Tuple
 
 import discord
 
 # noinspection PyUnresolvedReferences
 import ksoftapi
-from redbot.core import commands
+from redbot.core import Config, commands
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils.chat_formatting import (
     bold,
+    box,
     humanize_list,
+    humanize_number,
     inline,
-    pagify,
 )
-from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 from redbot.core.utils.predicates import MessagePredicate
 
+from .cache import LyricsCache, normalize_query
+from .index import LyricsIndex
+from .menus import LyricsPages, lyrics_menu
+from .scheduler import KSoftScheduler, QueueFull, QuotaExceeded
+
 BASE_URL = "https://api.ksoft.si/lyrics/search"
 BOT_SONG_RE = re.compile(
     (
@@ -26,6 +34,15 @@ BOT_SONG_RE = re.compile(
     flags=re.I,
 )
 # https://github.com/TheWyn/Wyn-RedV3Cogs/blob/master/lyrics/lyrics.py#L10
+# Choice offered when the results come from the local index.
+SEARCH_KSOFT = object()
+
+DEFAULT_GLOBAL = {
+    "rate_limit": 60,  # Requests per minute made to KSoft.Si by the bot.
+    "burst": 10,  # Requests made at once before being rate limited.
+    "daily_quota": 0,  # Requests per day, 0 for unlimited.
+    "usage": {"day": None, "used": 0},  # Requests made on the last day a request was made.
+}
 
 
 class Lyrics(commands.Cog):
@@ -37,6 +54,25 @@ class Lyrics(commands.Cog):
         super().__init__(*args, **kwargs)
         self.bot = bot
         self.client = None
+        self.cache = LyricsCache(cog_data_path(raw_name="Lyrics") / "cache")
+        self.index = LyricsIndex(cog_data_path(raw_name="Lyrics") / "index.sqlite3")
+        self.index_hits = 0
+        self._menus: Set[asyncio.Task] = set()
+        self.data = Config.get_conf(self, identifier=495954059, force_registration=True)
+        self.data.register_global(**DEFAULT_GLOBAL)
+        self.scheduler = KSoftScheduler(
+            DEFAULT_GLOBAL["rate_limit"] / 60,
+            DEFAULT_GLOBAL["burst"],
+            DEFAULT_GLOBAL["daily_quota"],
+        )
+
+    async def initialize(self):
+        settings = await self.data.all()
+        self.scheduler.rate = settings["rate_limit"] / 60
+        self.scheduler.burst = settings["burst"]
+        self.scheduler.daily_quota = settings["daily_quota"]
+        # The quota is not reset by reloading the cog.
+        self.scheduler.restore(settings["usage"]["day"], settings["usage"]["used"])
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """Thanks Sinbad!"""
@@ -64,75 +100,246 @@ class Lyrics(commands.Cog):
     async def lyrics(self, ctx: commands.Context, *, song_name: str):
         """Return the lyrics of a given music/song name.
 
+        You can also search a song by a line of its lyrics.
         Powered by KSoft.Si.
         """
         song_name = BOT_SONG_RE.sub("", song_name)
+        music = await self._search_and_choose(ctx, song_name, use_index=True)
+        if music is SEARCH_KSOFT:
+            music = await self._search_and_choose(ctx, song_name, use_index=False)
+        if music is None:
+            return
+        pages = LyricsPages(music, await ctx.embed_color(), ctx.author.avatar_url)
+        if len(pages) > 1:
+            # No await since max_concurrency is here
+            task = create_task(lyrics_menu(ctx, pages, timeout=600))
+            self._menus.add(task)
+            task.add_done_callback(self._menus.discard)
+        else:
+            await ctx.send(embed=pages.get_page(0))
+
+    async def _search_and_choose(self, ctx: commands.Context, song_name: str, use_index: bool):
+        """Search a song and ask the user to choose one of the results.
+
+        Return the chosen music, SEARCH_KSOFT if the user asked to search KSoft.Si instead of
+        the local index, or None if the search failed or the user did not choose.
+        """
+        queue_message = None
+
+        async def on_queued(position: int):
+            nonlocal queue_message
+            queue_message = await ctx.send(
+                "KSoft.Si is busy, you are #{position} in the queue.".format(position=position)
+            )
+
         try:
-            client = await self.obtain_client()
+            music_lyrics, from_index = await self.search_lyrics(
+                song_name, ctx.guild.id if ctx.guild else None, on_queued, use_index=use_index
+            )
+        except QueueFull:
+            await ctx.send("Too many searches are waiting in this server, try again later.")
+            return None
+        except QuotaExceeded:
+            await ctx.send("The daily quota of KSoft.Si is used up, try again tomorrow.")
+            return None
         except AttributeError:
             await ctx.send("Not key for KSoft.Si has been set, ask owner to add a key.")
-            return
-        try:
-            music_lyrics = await client.music.lyrics(song_name)
+            return None
         except ksoftapi.NoResults:
             await ctx.send("No lyrics were found for your music.")
-            return
+            return None
         except ksoftapi.APIError as e:
             await ctx.send(
                 "The API returned an unknown error: {error}".format(error=inline(str(e)))
             )
-            return
+            return None
         except ksoftapi.Forbidden:
             await ctx.send("Request forbidden by the API.")
-            return
+            return None
         except KeyError:
             await ctx.send("The set API key seem to be wrong. Please contact the bot owner.")
-            return
-        message, available_musics = await self._title_choose(music_lyrics)
+            return None
+        finally:
+            if queue_message is not None:
+                with contextlib.suppress(discord.NotFound):
+                    await queue_message.delete()
+        message, available_musics = await self._title_choose(music_lyrics, search_ksoft=from_index)
         bot_message = await ctx.maybe_send_embed(message)
-        predicator = MessagePredicate.less(10, ctx)
+        predicator = MessagePredicate.less(len(available_musics), ctx)
         try:
             user_message = await self.bot.wait_for("message", check=predicator, timeout=60)
             await bot_message.delete()
         except Te:
             await ctx.send("Rude.")
             await bot_message.delete()
-            return
+            return None
 
         chosen_music = user_message.content
         if chosen_music not in available_musics:
             await ctx.send(
                 "I was unable to find the corresponding music in the available music list."
             )
-            return
-        music = available_musics[chosen_music]
-        embeds = []
-        color = await ctx.embed_color()
-        for text in pagify(music.lyrics):
-            embed = discord.Embed(color=color, title=music.name, description=None)
-            embed.set_thumbnail(
-                url=music.album_art
-                if str(music.album_art) != "https://cdn.ksoft.si/images/Logo1024%20-%20W.png"
-                else discord.Embed.Empty
+            return None
+        return available_musics[chosen_music]
+
+    @commands.group()
+    @commands.is_owner()
+    async def lyricsset(self, ctx: commands.Context):
+        """Manage the Lyrics cog."""
+
+    @lyricsset.command(name="cache")
+    async def lyricsset_cache(self, ctx: commands.Context):
+        """Show how many searches were answered without KSoft.Si."""
+        files, size = await asyncio.get_running_loop().run_in_executor(None, self.cache.disk_usage)
+        message = (
+            "memory hits: {memory_hits}\n"
+            "disk hits: {disk_hits}\n"
+            "misses: {misses}\n"
+            "hit ratio: {ratio:.1%}\n"
+            "searches on disk: {files} ({size} KiB)\n"
+            "index hits: {index_hits}\n"
+            "songs indexed: {songs}"
+        ).format(
+            memory_hits=humanize_number(self.cache.memory_hits),
+            disk_hits=humanize_number(self.cache.disk_hits),
+            misses=humanize_number(self.cache.misses),
+            ratio=self.cache.hit_ratio,
+            files=humanize_number(files),
+            size=humanize_number(size // 1024),
+            index_hits=humanize_number(self.index_hits),
+            songs=humanize_number(await self.index.count()),
+        )
+        await ctx.send(box(message, lang="yaml"))
+
+    @lyricsset.command(name="purge")
+    async def lyricsset_purge(self, ctx: commands.Context, *, song_name: str = None):
+        """Remove the cached searches.
+
+        Give a song name to only remove its search.
+        """
+        if song_name is not None:
+            song_name = normalize_query(BOT_SONG_RE.sub("", song_name))
+        removed = await self.cache.purge(song_name)
+        await ctx.send("{count} cached searches removed.".format(count=humanize_number(removed)))
+
+    @lyricsset.command(name="clearindex")
+    async def lyricsset_clearindex(self, ctx: commands.Context):
+        """Remove every song from the local lyrics index."""
+        await self.index.clear()
+        await ctx.tick()
+
+    @lyricsset.command(name="quota")
+    async def lyricsset_quota(self, ctx: commands.Context):
+        """Show the requests made to KSoft.Si and the servers making them."""
+        scheduler = self.scheduler
+        remaining = scheduler.remaining_today
+        message = (
+            "rate limit: {rate}/min (burst of {burst})\n"
+            "used today: {used_today}/{quota}\n"
+            "remaining today: {remaining}\n"
+            "used since loaded: {used_total}\n"
+            "waited for their turn: {waited}\n"
+            "waiting now: {queued}"
+        ).format(
+            rate=humanize_number(round(scheduler.rate * 60)),
+            burst=humanize_number(scheduler.burst),
+            used_today=humanize_number(scheduler.used_today),
+            quota=humanize_number(scheduler.daily_quota) if scheduler.daily_quota else "unlimited",
+            remaining=humanize_number(remaining) if remaining is not None else "unlimited",
+            used_total=humanize_number(scheduler.used_total),
+            waited=humanize_number(scheduler.waited),
+            queued=humanize_number(scheduler.queued),
+        )
+        top = scheduler.guilds_today.most_common(5)
+        if top:
+            message += "\ntop servers today:"
+            for guild_id, used in top:
+                guild = self.bot.get_guild(guild_id) if guild_id else None
+                message += "\n  {name}: {used}".format(
+                    name=guild.name if guild else guild_id or "Direct messages",
+                    used=humanize_number(used),
+                )
+        await ctx.send(box(message, lang="yaml"))
+
+    @lyricsset.command(name="ratelimit")
+    async def lyricsset_ratelimit(
+        self, ctx: commands.Context, per_minute: int, burst: int, daily_quota: int = 0
+    ):
+        """
+        Set how many requests can be made to KSoft.Si.
+
+        ``per_minute``: Requests per minute made by the bot.
+        ``burst``: Requests made at once before being rate limited.
+        ``daily_quota``: Requests per day, 0 for unlimited.
+        """
+        if per_minute < 1 or burst < 1 or daily_quota < 0:
+            await ctx.send(
+                "The rate limit and the burst must be at least 1, and the daily quota cannot be "
+                "negative."
             )
-            embed.set_footer(text="Powered by KSoft.Si.", icon_url=ctx.author.avatar_url)
-            embed.description = text
-            embeds.append(embed)
-        if len(embeds) > 1:
-            create_task(
-                menu(ctx, embeds, DEFAULT_CONTROLS, timeout=600)
-            )  # No await since max_concurrency is here
-        else:
-            await ctx.send(embed=embeds[0])
+            return
+        await self.data.rate_limit.set(per_minute)
+        await self.data.burst.set(burst)
+        await self.data.daily_quota.set(daily_quota)
+        await self.initialize()
+        await ctx.tick()
+
+    async def search_lyrics(
+        self,
+        song_name: str,
+        guild_id: Optional[int] = None,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        *,
+        use_index: bool = True,
+    ) -> Tuple[list, bool]:
+        """Return the results of KSoft.Si for a song, cached, and whether they come from the
+        local index.
+
+        Songs already fetched are looked up in the local index before asking KSoft.Si, unless
+        ``use_index`` is False. Results of the index are not cached, they can miss the song
+        searched while KSoft.Si would find it.
+        Requests to KSoft.Si wait for their turn in the scheduler, ``on_queued`` is called
+        with the position of the request when it has to wait.
+
+        Raises
+        ------
+        AttributeError:
+            If the API key was not set.
+        QueueFull:
+            If too many requests of the guild are waiting.
+        QuotaExceeded:
+            If the daily quota is used up.
+        ksoftapi.NoResults:
+            If no lyrics were found.
+        """
+        query = normalize_query(song_name)
+        results = await self.cache.get(query)
+        if results is not None:
+            return results, False
+        if use_index:
+            results = await self.index.search(query)
+            if results:
+                self.index_hits += 1
+                return results, True
+        client = await self.obtain_client()
+        await self.scheduler.acquire(guild_id, on_queued)
+        await self.data.usage.set({"day": self.scheduler.day, "used": self.scheduler.used_today})
+        results = await client.music.lyrics(song_name)
+        await self.index.add(results)
+        await self.cache.set(query, results)
+        return results, False
 
     @staticmethod
-    async def _title_choose(list_of_music: list):
+    async def _title_choose(list_of_music: list, search_ksoft: bool = False):
         """Function to return for requesting user's prompt, asking what music to choose.
 
         Parameters
         ----------
         list_of_music: list
             A list containing musics.
+        search_ksoft: bool
+            If the user can choose to search KSoft.Si instead, the value of the choice is
+            SEARCH_KSOFT.
 
         Returns
         -------
@@ -159,6 +366,9 @@ class Lyrics(commands.Cog):
             )
             method[str(n)] = music
             n += 1
+        if search_ksoft:
+            message += "`{number}` - None of these, search on KSoft.Si\n".format(number=n)
+            method[str(n)] = SEARCH_KSOFT
         return message, method
 
     async def obtain_client(self):
@@ -189,3 +399,7 @@ class Lyrics(commands.Cog):
     def cog_unload(self):
         if self.client:
             create_task(self.__session_closer(self.client))
+        create_task(self.index.close())
+        for task in self._menus:
+            task.cancel()
+        self.scheduler.close()
@@ -0,0 +1,125 @@
+import asyncio
+import contextlib
+from typing import Iterator, List, Optional, Tuple
+
+import discord
+from ksoftapi.models import LyricResult
+from redbot.core import commands
+from redbot.core.utils.chat_formatting import escape
+from redbot.core.utils.menus import start_adding_reactions
+from redbot.core.utils.predicates import ReactionPredicate
+
+# Characters of lyrics shown on a page, like pagify.
+PAGE_LENGTH = 1992
+KSOFT_LOGO = "https://cdn.ksoft.si/images/Logo1024%20-%20W.png"
+
+PREVIOUS = "\N{LEFTWARDS BLACK ARROW}\N{VARIATION SELECTOR-16}"
+CLOSE = "\N{CROSS MARK}"
+NEXT = "\N{BLACK RIGHTWARDS ARROW}\N{VARIATION SELECTOR-16}"
+
+
+def page_bounds(text: str, page_length: int = PAGE_LENGTH) -> Iterator[Tuple[int, int]]:
+    """Yield the start and end of each page of ``text``, cut on line breaks when possible."""
+    start = 0
+    while len(text) - start > page_length:
+        end = text.rfind("\n", start + 1, start + page_length)
+        if end == -1:
+            end = start + page_length
+            yield start, end
+            start = end
+        else:
+            yield start, end
+            start = end + 1  # The line break is not shown.
+    yield start, len(text)
+
+
+class LyricsPages:
+    """Build the embeds of the lyrics of a song when they are shown.
+
+    Only the bounds of the pages are kept, the lyrics stay in the result from KSoft.Si.
+    """
+
+    def __init__(self, music: LyricResult, color: discord.Colour, icon_url: str):
+        self.music: LyricResult = music
+        self.color: discord.Colour = color
+        self.icon_url: str = icon_url
+        self._bounds: List[Tuple[int, int]] = list(page_bounds(music.lyrics))
+
+    def __len__(self) -> int:
+        return len(self._bounds)
+
+    def get_page(self, page: int) -> discord.Embed:
+        start, end = self._bounds[page]
+        embed = discord.Embed(
+            color=self.color,
+            title=self.music.name,
+            description=escape(self.music.lyrics[start:end], mass_mentions=True),
+        )
+        embed.set_thumbnail(
+            url=(
+                self.music.album_art
+                if str(self.music.album_art) != KSOFT_LOGO
+                else discord.Embed.Empty
+            )
+        )
+        footer = "Powered by KSoft.Si."
+        if len(self) > 1:
+            footer += " Page {page}/{total}".format(page=page + 1, total=len(self))
+        embed.set_footer(text=footer, icon_url=self.icon_url)
+        return embed
+
+
+async def lyrics_menu(
+    ctx: commands.Context, pages: LyricsPages, timeout: float = 600
+) -> Optional[discord.Message]:
+    """Send the lyrics and let the author turn their pages with reactions.
+
+    Unlike Red's menu, only the page shown is built.
+    """
+    page = 0
+    message = await ctx.send(embed=pages.get_page(page))
+    if len(pages) == 1:
+        return message
+    controls = (PREVIOUS, CLOSE, NEXT)
+    adding = start_adding_reactions(message, controls)
+    predicate = ReactionPredicate.with_emojis(controls, message, ctx.author)
+    try:
+        while True:
+            try:
+                reaction, user = await ctx.bot.wait_for(
+                    "reaction_add", check=predicate, timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                await _remove_controls(ctx, message, controls)
+                return message
+            if reaction.emoji == CLOSE:
+                with contextlib.suppress(discord.NotFound):
+                    await message.delete()
+                return None
+            if message.channel.permissions_for(ctx.me).manage_messages:
+                with contextlib.suppress(discord.NotFound):
+                    await message.remove_reaction(reaction.emoji, ctx.author)
+            page = (page + (1 if reaction.emoji == NEXT else -1)) % len(pages)
+            try:
+                await message.edit(embed=pages.get_page(page))
+            except discord.NotFound:
+                return None
+    finally:
+        adding.cancel()
+
+
+async def _remove_controls(ctx: commands.Context, message: discord.Message, controls):
+    with contextlib.suppress(discord.NotFound):
+        try:
+            if message.channel.permissions_for(ctx.me).manage_messages:
+                await message.clear_reactions()
+                return
+        except discord.Forbidden:
+            pass
+        for emoji in controls:
+            try:
+                await message.remove_reaction(emoji, ctx.bot.user)
+            except discord.Forbidden:
+                return
+            except discord.HTTPException:
+                pass
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Optional
+
+# Requests of a guild waiting for their turn, the next ones are refused.
+MAX_QUEUE = 20
+
+
+class QueueFull(Exception):
+    """Raised when a guild has too many requests waiting for KSoft.Si."""
+
+
+class QuotaExceeded(Exception):
+    """Raised when the daily quota of the API key is used up."""
+
+
+class KSoftScheduler:
+    """Decide when requests to KSoft.Si can be made.
+
+    A token bucket limits the requests of the whole bot to ``rate`` per second, with bursts
+    of up to ``burst`` requests. When requests have to wait, each guild has its own queue and
+    the queues are served in turn, so a busy guild cannot starve the others. Requests made
+    each day are counted and refused past ``daily_quota``, 0 being unlimited.
+    """
+
+    def __init__(self, rate: float, burst: int, daily_quota: int = 0):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.daily_quota: int = daily_quota
+
+        self._tokens: float = burst
+        self._updated: float = time.monotonic()
+        # Guild ID: Waiting requests. The first guild is served next.
+        self._queues: "OrderedDict[Optional[int], Deque[asyncio.Future]]" = OrderedDict()
+        self._worker: Optional[asyncio.Task] = None
+
+        self.day: str = self._today()
+        self.used_today: int = 0
+        self.guilds_today: Counter = Counter()
+        self.used_total: int = 0
+        self.waited: int = 0  # Requests that had to wait for their turn.
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def remaining_today(self) -> Optional[int]:
+        self._roll_day()
+        return max(self.daily_quota - self.used_today, 0) if self.daily_quota else None
+
+    def restore(self, day: str, used: int) -> None:
+        """Restore the requests made today, saved before the cog was reloaded."""
+        self._roll_day()
+        if day == self.day:
+            self.used_today = max(self.used_today, used)
+
+    def _roll_day(self) -> None:
+        today = self._today()
+        if today != self.day:
+            self.day = today
+            self.used_today = 0
+            self.guilds_today.clear()
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def position(self, guild_id: Optional[int], future: asyncio.Future) -> int:
+        """Return the position of a waiting request, 1 being the next one served."""
+        own = self._queues.get(guild_id)
+        if not own or future not in own:
+            return 0
+        index = own.index(future)
+        position = 0
+        before = True
+        for other_id, queue in self._queues.items():
+            if other_id == guild_id:
+                before = False
+                position += index + 1
+            else:
+                # Guilds served before this one in each round get one more turn.
+                position += min(len(queue), index + 1 if before else index)
+        return position
+
+    async def acquire(
+        self,
+        guild_id: Optional[int],
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> None:
+        """Wait until a request can be made for a guild.
+
+        ``on_queued`` is called with the position of the request if it has to wait.
+
+        Raises:
+            QueueFull: Too many requests of this guild are waiting.
+            QuotaExceeded: The daily quota is used up.
+        """
+        self._roll_day()
+        if self.daily_quota and self.used_today >= self.daily_quota:
+            raise QuotaExceeded()
+        if not self._queues and self._take_token():
+            self._record(guild_id)
+            return
+        queue = self._queues.setdefault(guild_id, deque())
+        if len(queue) >= MAX_QUEUE:
+            raise QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self.waited += 1
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._serve())
+        try:
+            if on_queued is not None:
+                await on_queued(self.position(guild_id, future))
+            await future
+        except BaseException:
+            if future in queue:
+                queue.remove(future)
+                if not queue and self._queues.get(guild_id) is queue:
+                    del self._queues[guild_id]
+            elif future.done() and not future.cancelled():
+                # Served but not used, the token taken for this request is given back.
+                self._tokens = min(self.burst, self._tokens + 1)
+            raise
+        self._roll_day()
+        if self.daily_quota and self.used_today >= self.daily_quota:
+            # The token taken for this request is given back.
+            self._tokens = min(self.burst, self._tokens + 1)
+            raise QuotaExceeded()
+        self._record(guild_id)
+
+    def _record(self, guild_id: Optional[int]) -> None:
+        self.used_today += 1
+        self.used_total += 1
+        self.guilds_today[guild_id] += 1
+
+    async def _serve(self) -> None:
+        # Stops once no request is waiting, restarted by the next one.
+        while self._queues:
+            if not self._take_token():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            guild_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(guild_id)
+            else:
+                del self._queues[guild_id]
+            if future.done():  # Cancelled, the token is given back.
+                self._tokens += 1
+                continue
+            future.set_result(None)
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for queue in self._queues.values():
+            for future in queue:
+                future.cancel()
+        self._queues.clear()
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+from akinatorgame.akinatorcog import UserGame
+from akinatorgame.api import AkinatorAPI
+
+
+class FakeAkinator:
+    """Records the calls made to it, and whether two of them overlapped."""
+
+    def __init__(self):
+        self.step = 0
+        self.progression = 0.0
+        self.calls = []
+        self.running = 0
+        self.overlapped = False
+
+    async def _call(self, name):
+        self.running += 1
+        self.overlapped |= self.running > 1
+        self.calls.append((name, self.step))
+        await asyncio.sleep(0.01)
+        self.running -= 1
+
+    async def answer(self, answer):
+        await self._call("answer")
+        self.step += 1
+        self.progression += 25
+        return "Question {step}".format(step=self.step)
+
+    async def win(self):
+        await self._call("win")
+        return {"name": "Guess", "description": "", "absolute_picture_path": "picture.jpg"}
+
+
+def make_game():
+    game = UserGame(SimpleNamespace(id=1), SimpleNamespace(id=2), None, None, AkinatorAPI())
+    game.akinator = FakeAkinator()
+    game.prefetch_prog = 50
+    game.downloads = 0
+
+    async def fetch_picture(guess):
+        game.downloads += 1
+        return b"picture"
+
+    game.fetch_picture = fetch_picture
+    return game
+
+
+async def answer(game, times):
+    for _ in range(times):
+        await game.call("answer", game.akinator.answer, "yes")
+        game.start_prefetch()
+        await asyncio.sleep(0)  # The user reads the question.
+
+
+def test_prefetched_picture_is_reused():
+    async def scenario():
+        game = make_game()
+        await answer(game, 2)
+        prefetch = game.prefetch[1]
+        await answer(game, 2)
+        await prefetch
+        guess, picture = await game.obtain_guess()
+        return game, guess, picture
+
+    game, guess, picture = asyncio.run(scenario())
+    assert picture == b"picture"
+    assert guess["name"] == "Guess"
+    assert game.downloads == 1
+    assert not game.akinator.overlapped
+    assert [name for name, _ in game.akinator.calls].count("win") == 2
+    assert game.api.prefetch["hits"] == 1
+
+
+def test_guess_of_current_step_is_not_fetched_again():
+    async def scenario():
+        game = make_game()
+        await answer(game, 2)
+        await game.prefetch[1]
+        return game, await game.obtain_guess()
+
+    game, (guess, picture) = asyncio.run(scenario())
+    assert picture == b"picture"
+    assert game.akinator.calls == [("answer", 0), ("answer", 1), ("win", 2)]
+
+
+def test_unfinished_prefetch_shows_the_url():
+    async def scenario():
+        game = make_game()
+        await answer(game, 2)
+        prefetch = game.prefetch[1]
+        guess, picture = await game.obtain_guess()
+        await asyncio.sleep(0)
+        return game, prefetch, picture
+
+    game, prefetch, picture = asyncio.run(scenario())
+    assert prefetch.cancelled()
+    assert picture is None
+    assert game.api.prefetch["pending"] == 1
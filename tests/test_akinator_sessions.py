@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from akinatorgame.sessions import AlreadyPlaying, SessionManager
+
+
+class FakeGame:
+    def __init__(self, user_id: int, guild_id: int = 1):
+        self.user = SimpleNamespace(id=user_id)
+        self.guild_id = guild_id
+        self.task = None
+        self.last_activity = 0.0
+        self.closed = False
+
+    def cancel(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+def test_queued_player_cannot_queue_again():
+    async def scenario():
+        sessions = SessionManager(global_limit=1, guild_limit=1, idle_timeout=300)
+        first = FakeGame(1)
+        await sessions.add(first)
+        waiting = asyncio.ensure_future(sessions.add(FakeGame(2)))
+        await asyncio.sleep(0)
+        assert sessions.is_playing(2)
+        with pytest.raises(AlreadyPlaying):
+            await sessions.add(FakeGame(2))
+        await sessions.release(first)
+        await waiting
+        assert list(sessions.games) == [2]
+        await sessions.release(sessions.games[2])
+        assert sessions.live == 0
+        assert sessions.guild_counts == {}
+        await sessions.close()
+
+    asyncio.run(scenario())
+
+
+def test_release_frees_the_guild_slot():
+    async def scenario():
+        sessions = SessionManager(global_limit=5, guild_limit=1, idle_timeout=300)
+        game = FakeGame(1)
+        await sessions.add(game)
+        assert sessions.queue_position(1) == 1
+        await sessions.release(game)
+        await sessions.release(game)  # Releasing twice is harmless.
+        assert game.closed
+        assert sessions.guild_counts == {}
+        assert sessions.queue_position(1) == 0
+        await sessions.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    async def scenario():
+        sessions = SessionManager(global_limit=1, guild_limit=1, idle_timeout=300)
+        first, second = FakeGame(1), FakeGame(2)
+        await sessions.add(first)
+        waiting = asyncio.ensure_future(sessions.add(second))
+        await asyncio.sleep(0)
+        # The slot is given to the waiter, which is cancelled before it resumes.
+        await sessions.release(first)
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            await asyncio.sleep(0)
+            assert sessions.live == 0
+            assert sessions.guild_counts == {}
+        else:
+            # Some Python versions let wait_for() return once the future is done, the game
+            # is then released by its command.
+            assert sessions.games == {2: second}
+        await sessions.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from captcha import moderation
+from captcha.moderation import ModerationExecutor
+
+
+@pytest.fixture(autouse=True)
+def no_interval(monkeypatch):
+    monkeypatch.setattr(moderation, "ACTION_INTERVAL", 0)
+
+
+class FakeGuild:
+    def __init__(self, kick_delay: float = 0):
+        self.id = 1
+        self.name = "Guild"
+        self.me = SimpleNamespace(guild_permissions=SimpleNamespace(ban_members=True))
+        self.kick_delay = kick_delay
+        self.kicked = []
+
+    async def kick(self, member, *, reason=None):
+        await asyncio.sleep(self.kick_delay)
+        self.kicked.append(member.id)
+
+
+class FakeMember:
+    def __init__(self, guild: FakeGuild, member_id: int):
+        self.guild = guild
+        self.id = member_id
+        self.dms = 0
+
+    async def send(self, *args, **kwargs):
+        self.dms += 1
+
+
+def test_members_are_kicked_in_order():
+    guild = FakeGuild()
+    members = [FakeMember(guild, index) for index in range(25)]
+
+    async def scenario():
+        executor = ModerationExecutor()
+        return await asyncio.gather(*(executor.submit(member, "Failed.") for member in members))
+
+    assert asyncio.run(scenario()) == ["kicked"] * 25
+    assert guild.kicked == list(range(25))
+
+
+def test_members_are_not_dmed_during_a_raid():
+    guild = FakeGuild()
+    members = [FakeMember(guild, index) for index in range(14)]
+
+    async def scenario():
+        executor = ModerationExecutor()
+        await asyncio.gather(*(executor.submit(member, "Failed.") for member in members))
+
+    asyncio.run(scenario())
+    # Only the members kicked once less than DM_SKIP_THRESHOLD others were waiting.
+    assert [member.dms for member in members] == [0] * 9 + [1] * 5
+
+
+def test_stop_cancels_every_action():
+    guild = FakeGuild(kick_delay=10)
+    members = [FakeMember(guild, index) for index in range(moderation.BATCH_SIZE + 5)]
+
+    async def scenario():
+        executor = ModerationExecutor()
+        tasks = [asyncio.ensure_future(executor.submit(member, "Failed.")) for member in members]
+        await asyncio.sleep(0.01)  # The worker takes a batch and starts the first kick.
+        assert executor.pending(guild.id) == len(members)
+        executor.stop()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=1)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from captcha.registry import InMemoryRegistry, SQLiteRegistry
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def registries(request, tmp_path):
+    """Two registries shared by two processes."""
+    if request.param == "memory":
+        first = InMemoryRegistry("first")
+        second = InMemoryRegistry("second")
+        second._claims = first._claims
+        return first, second
+    path = tmp_path / "registry.sqlite3"
+    return SQLiteRegistry(path, "first"), SQLiteRegistry(path, "second")
+
+
+def test_expired_claim_is_taken_over(registries):
+    first, second = registries
+
+    async def run():
+        assert await first.claim(1, 10, ttl=-1)
+        assert not await first.is_claimed(1, 10)
+        [claim] = await second.expired()
+        assert claim.owner == "first"
+        assert await second.claim(1, 10, ttl=60)
+        assert not await first.claim(1, 10, ttl=60)
+        assert await second.expired() == []
+
+    asyncio.run(run())
+
+
+def test_discard_expired_keeps_live_claims(registries):
+    first, second = registries
+
+    async def run():
+        assert await first.claim(1, 10, ttl=-1)
+        assert await first.claim(1, 11, ttl=60)
+        assert await second.discard_expired(1, 10)
+        assert not await second.discard_expired(1, 10)
+        assert not await second.discard_expired(1, 11)
+        assert await second.is_claimed(1, 11)
+        assert await second.expired(now=time.time() + 120) != []
+
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+import asyncio
+
+from captcha.scheduler import TimeoutScheduler
+
+
+def test_deadlines_fire_in_order_once():
+    async def run():
+        fired = []
+        scheduler = TimeoutScheduler(fired.extend, resolution=0)
+        scheduler.schedule("late", 0.1)
+        scheduler.schedule("early", 0.02)
+        scheduler.schedule("cancelled", 0.01)
+        scheduler.cancel("cancelled")
+        await asyncio.sleep(0.2)
+        scheduler.stop()
+        return fired
+
+    assert asyncio.run(run()) == ["early", "late"]
+
+
+def test_rescheduled_key_uses_last_deadline():
+    async def run():
+        fired = []
+        scheduler = TimeoutScheduler(fired.extend, resolution=0)
+        scheduler.schedule("key", 0.02)
+        scheduler.schedule("key", 0.1)
+        await asyncio.sleep(0.05)
+        before = list(fired)
+        await asyncio.sleep(0.1)
+        scheduler.stop()
+        return before, fired
+
+    assert asyncio.run(run()) == ([], ["key"])
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from cleverbot import breaker
+from cleverbot.asynccleverbot import cleverbot as ac
+from cleverbot.breaker import CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(breaker, "BACKOFF", 0)
+
+
+class FlakyClient(ac.Cleverbot):
+    """A client whose requests fail ``failures`` times before being answered."""
+
+    def __init__(self, failures: int, context: ac.DictContext = None):
+        super().__init__("key", context=context)
+        self.failures = failures
+        self.payloads = []
+
+    async def request(self, payload: dict):
+        self.payloads.append(payload)
+        if self.failures:
+            self.failures -= 1
+            raise ac.APIDown("Down.")
+        return ac.Response("Hello.", "success")
+
+
+def test_transient_errors_are_retried():
+    client = FlakyClient(failures=breaker.RETRIES - 1)
+    response = asyncio.run(CircuitBreaker().call(lambda: client.request({})))
+    assert str(response) == "Hello."
+    assert len(client.payloads) == breaker.RETRIES
+
+
+def test_last_error_is_raised():
+    client = FlakyClient(failures=breaker.RETRIES)
+    with pytest.raises(ac.APIDown):
+        asyncio.run(CircuitBreaker().call(lambda: client.request({})))
+
+
+def test_other_errors_are_not_retried():
+    calls = 0
+
+    async def invalid_key():
+        nonlocal calls
+        calls += 1
+        raise ac.InvalidKey("Invalid.")
+
+    with pytest.raises(ac.InvalidKey):
+        asyncio.run(CircuitBreaker().call(invalid_key))
+    assert calls == 1
+
+
+def test_circuit_opens_then_probes():
+    circuit = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    client = FlakyClient(failures=2)
+
+    async def scenario():
+        with pytest.raises(ac.APIDown):
+            await circuit.call(lambda: client.request({}))
+        assert circuit.state == circuit.OPEN
+        with pytest.raises(CircuitOpen):
+            await circuit.call(lambda: client.request({}))
+        await asyncio.sleep(0.05)
+        assert circuit.state == circuit.HALF_OPEN
+        await circuit.call(lambda: client.request({}))
+        assert circuit.state == circuit.CLOSED
+
+    asyncio.run(scenario())
+    assert len(client.payloads) == 3
+
+
+def test_retries_do_not_repeat_the_context():
+    context = ac.DictContext(window=2)
+    client = FlakyClient(failures=breaker.RETRIES - 1, context=context)
+
+    async def ask(question: str):
+        payload = client.make_payload(question, 1)
+        return await CircuitBreaker().call(lambda: client.request(payload))
+
+    for question in ("first", "second", "third"):
+        client.failures = breaker.RETRIES - 1
+        asyncio.run(ask(question))
+    assert client.payloads[-1]["context"] == ["second", "third"]
+
+
+def test_context_forgets_least_recent_user():
+    context = ac.DictContext(window=2, max_users=2)
+    context.update_context(1, "a")
+    context.update_context(2, "b")
+    context.update_context(1, "c")
+    context.update_context(3, "d")
+    assert len(context) == 2
+    assert context.update_context(2, "e") == {"text": "e"}
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from lyrics.scheduler import MAX_QUEUE, KSoftScheduler, QueueFull, QuotaExceeded
+
+
+def test_guilds_are_served_in_turn():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=200, burst=1)
+        await scheduler.acquire(0)  # Empties the bucket.
+        served, positions = [], {}
+
+        async def request(guild_id: int, index: int):
+            async def on_queued(position: int):
+                positions[guild_id, index] = position
+
+            await scheduler.acquire(guild_id, on_queued)
+            served.append(guild_id)
+
+        # Guild 1 asks first and the most, the others are not starved.
+        requests = [(1, 0), (1, 1), (1, 2), (2, 0), (3, 0), (2, 1)]
+        tasks = []
+        for guild_id, index in requests:
+            tasks.append(asyncio.ensure_future(request(guild_id, index)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        scheduler.close()
+        return served, positions
+
+    served, positions = asyncio.run(scenario())
+    assert served == [1, 2, 3, 1, 2, 1]
+    assert positions[1, 0] == 1
+    assert positions[2, 0] == 2
+    assert positions[3, 0] == 3
+
+
+def test_cancelled_request_leaves_the_queue():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=50, burst=1)
+        await scheduler.acquire(1)
+        first = asyncio.ensure_future(scheduler.acquire(1))
+        second = asyncio.ensure_future(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 2
+        first.cancel()
+        await second
+        assert scheduler.queued == 0
+        assert scheduler.used_total == 2
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_request_returns_its_served_token():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=10, burst=1)
+        await scheduler.acquire(1)
+        served = asyncio.Event()
+
+        async def on_queued(position: int):
+            await served.wait()  # Still running when the request is served.
+            raise RuntimeError()
+
+        waiting = asyncio.ensure_future(scheduler.acquire(1, on_queued))
+        await asyncio.sleep(0.15)  # Served after 0.1s.
+        assert scheduler.queued == 0
+        served.set()
+        with pytest.raises(RuntimeError):
+            await waiting
+        assert scheduler.used_total == 1
+        await asyncio.wait_for(scheduler.acquire(1), timeout=0.001)  # Without waiting.
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_queue_is_bounded_per_guild():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=0.001, burst=1)
+        await scheduler.acquire(1)
+        waiting = [asyncio.ensure_future(scheduler.acquire(1)) for _ in range(MAX_QUEUE)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await scheduler.acquire(1)
+        other = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+        assert not other.done()  # Another guild can still wait for its turn.
+        scheduler.close()
+        await asyncio.gather(*waiting, other, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_daily_quota():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=100, burst=1, daily_quota=2)
+        await scheduler.acquire(1)
+        first = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+        # Queued behind guild 2, which uses the last request.
+        with pytest.raises(QuotaExceeded):
+            await scheduler.acquire(1)
+        await first
+        assert scheduler.remaining_today == 0
+        assert scheduler.guilds_today == {1: 1, 2: 1}
+        with pytest.raises(QuotaExceeded):
+            await scheduler.acquire(3)
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_refused_request_gives_its_token_back():
+    async def scenario():
+        scheduler = KSoftScheduler(rate=100, burst=1, daily_quota=2)
+        await scheduler.acquire(1)
+        refused = asyncio.ensure_future(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        scheduler.used_today = 2  # Used by another process meanwhile.
+        with pytest.raises(QuotaExceeded):
+            await refused
+        assert scheduler._tokens > 0.99
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_usage_is_restored_for_the_same_day():
+    scheduler = KSoftScheduler(rate=1, burst=1, daily_quota=5)
+    scheduler.restore(scheduler.day, 5)
+    assert scheduler.remaining_today == 0
+    with pytest.raises(QuotaExceeded):
+        asyncio.run(scheduler.acquire(1))
+    scheduler = KSoftScheduler(rate=1, burst=1, daily_quota=5)
+    scheduler.restore("2000-01-01", 5)
+    assert scheduler.remaining_today == 5